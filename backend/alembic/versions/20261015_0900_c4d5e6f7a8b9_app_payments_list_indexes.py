@@ -0,0 +1,37 @@
+"""app payments list indexes
+
+Revision ID: c4d5e6f7a8b9
+Revises: b3c4d5e6f7g8
+Create Date: 2026-10-15 09:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d5e6f7a8b9"
+down_revision: Union[str, None] = "b3c4d5e6f7g8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Listagem admin: filtros por status/provider/user + ORDER BY created_at DESC LIMIT
+    # (ix_app_payments_created_at e ix_app_payments_user_created já existem)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_payments_status_created "
+        "ON app_payments (status, created_at DESC) INCLUDE (provider, user_id, amount_cents)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_payments_provider_created "
+        "ON app_payments (provider, created_at DESC)"
+    )
+    op.execute("ANALYZE app_payments")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_app_payments_provider_created")
+    op.execute("DROP INDEX IF EXISTS ix_app_payments_status_created")
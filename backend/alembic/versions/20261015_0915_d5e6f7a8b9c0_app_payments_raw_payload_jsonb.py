@@ -0,0 +1,26 @@
+"""app payments raw_payload jsonb
+
+Revision ID: d5e6f7a8b9c0
+Revises: c4d5e6f7a8b9
+Create Date: 2026-10-15 09:15:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5e6f7a8b9c0"
+down_revision: Union[str, None] = "c4d5e6f7a8b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE app_payments ALTER COLUMN raw_payload TYPE JSONB USING raw_payload::jsonb")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE app_payments ALTER COLUMN raw_payload TYPE TEXT USING raw_payload::text")
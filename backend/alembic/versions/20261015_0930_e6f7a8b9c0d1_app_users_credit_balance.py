@@ -0,0 +1,59 @@
+"""app users materialized credit balance
+
+Revision ID: e6f7a8b9c0d1
+Revises: d5e6f7a8b9c0
+Create Date: 2026-10-15 09:30:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6f7a8b9c0d1"
+down_revision: Union[str, None] = "d5e6f7a8b9c0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE app_users ADD COLUMN IF NOT EXISTS credit_balance_cents INTEGER NOT NULL DEFAULT 0"
+    )
+
+    op.execute(
+        "CREATE OR REPLACE FUNCTION app_credit_ledger_apply_balance() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+        "UPDATE app_users SET credit_balance_cents = credit_balance_cents - OLD.amount_cents "
+        "WHERE id = OLD.user_id; "
+        "END IF; "
+        "IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+        "UPDATE app_users SET credit_balance_cents = credit_balance_cents + NEW.amount_cents "
+        "WHERE id = NEW.user_id; "
+        "END IF; "
+        "RETURN NULL; "
+        "END; "
+        "$$ LANGUAGE plpgsql"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_app_credit_ledger_balance ON app_credit_ledger")
+    op.execute(
+        "CREATE TRIGGER trg_app_credit_ledger_balance "
+        "AFTER INSERT OR DELETE OR UPDATE OF amount_cents, user_id ON app_credit_ledger "
+        "FOR EACH ROW EXECUTE FUNCTION app_credit_ledger_apply_balance()"
+    )
+
+    # Backfill a partir do ledger existente
+    op.execute(
+        "UPDATE app_users u SET credit_balance_cents = l.total "
+        "FROM (SELECT user_id, SUM(amount_cents) AS total FROM app_credit_ledger GROUP BY user_id) l "
+        "WHERE l.user_id = u.id"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_app_credit_ledger_balance ON app_credit_ledger")
+    op.execute("DROP FUNCTION IF EXISTS app_credit_ledger_apply_balance()")
+    op.execute("ALTER TABLE app_users DROP COLUMN IF EXISTS credit_balance_cents")
@@ -0,0 +1,31 @@
+"""app users lower() filter indexes
+
+Revision ID: f7a8b9c0d1e2
+Revises: e6f7a8b9c0d1
+Create Date: 2026-10-15 09:45:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f7a8b9c0d1e2"
+down_revision: Union[str, None] = "e6f7a8b9c0d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Segmentação de notificações filtra por lower(state/city/gender)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_app_users_lower_state ON app_users (lower(state))")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_app_users_lower_city ON app_users (lower(city))")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_app_users_lower_gender ON app_users (lower(gender))")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_app_users_lower_gender")
+    op.execute("DROP INDEX IF EXISTS ix_app_users_lower_city")
+    op.execute("DROP INDEX IF EXISTS ix_app_users_lower_state")
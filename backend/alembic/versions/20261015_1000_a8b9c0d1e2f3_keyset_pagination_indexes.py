@@ -0,0 +1,45 @@
+"""keyset pagination indexes for purchases and receipt keys
+
+Revision ID: a8b9c0d1e2f3
+Revises: f7a8b9c0d1e2
+Create Date: 2026-10-15 10:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a8b9c0d1e2f3"
+down_revision: Union[str, None] = "f7a8b9c0d1e2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cursor (data, id) por usuário: inclui id para desempate na ordenação
+    op.execute("DROP INDEX IF EXISTS ix_app_purchases_user_finished")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_purchases_user_finished "
+        "ON app_purchases (user_id, finished_at DESC, id DESC)"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_app_receipt_keys_user_created")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_receipt_keys_user_created "
+        "ON app_receipt_key_submissions (user_id, created_at DESC, id DESC)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_app_receipt_keys_user_created")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_receipt_keys_user_created "
+        "ON app_receipt_key_submissions (user_id, created_at)"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_app_purchases_user_finished")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_purchases_user_finished "
+        "ON app_purchases (user_id, finished_at)"
+    )
@@ -0,0 +1,36 @@
+"""receipt keys admin search indexes
+
+Revision ID: b9c0d1e2f3a4
+Revises: a8b9c0d1e2f3
+Create Date: 2026-10-15 10:15:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b9c0d1e2f3a4"
+down_revision: Union[str, None] = "a8b9c0d1e2f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fila de triagem (status=pending) paginada por (created_at, id)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_receipt_keys_pending_created "
+        "ON app_receipt_key_submissions (created_at DESC, id DESC) WHERE status = 'pending'"
+    )
+    # LIKE 'prefixo%' independente da collation do banco
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_app_receipt_keys_chave_prefix "
+        "ON app_receipt_key_submissions (chave_acesso varchar_pattern_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_app_receipt_keys_chave_prefix")
+    op.execute("DROP INDEX IF EXISTS ix_app_receipt_keys_pending_created")
@@ -0,0 +1,43 @@
+"""app shopping lists hot path indexes
+
+Revision ID: d1e2f3a4b5c6
+Revises: c0d1e2f3a4b5
+Create Date: 2026-10-15 10:45:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d1e2f3a4b5c6"
+down_revision: Union[str, None] = "c0d1e2f3a4b5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # As tabelas de listas do app não nascem nas migrations; só indexa se existirem
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('app_shopping_lists') IS NOT NULL THEN
+                -- Listagem do usuário ordenada por updated_at DESC
+                CREATE INDEX IF NOT EXISTS ix_app_shopping_lists_user_updated
+                    ON app_shopping_lists (user_id, updated_at DESC);
+            END IF;
+            IF to_regclass('app_shopping_list_items') IS NOT NULL THEN
+                -- Árbitro do ON CONFLICT ao adicionar item (já existe onde a constraint foi criada)
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_app_shopping_list_item
+                    ON app_shopping_list_items (shopping_list_id, canonical_id);
+            END IF;
+        END $$;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_app_shopping_lists_user_updated")
@@ -0,0 +1,32 @@
+"""precos latest per store index
+
+Revision ID: e2f3a4b5c6d7
+Revises: d1e2f3a4b5c6
+Create Date: 2026-10-15 11:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2f3a4b5c6d7"
+down_revision: Union[str, None] = "d1e2f3a4b5c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # DISTINCT ON (canonical_id, loja_id) ORDER BY data_coleta DESC lê o índice na ordem
+    op.execute("DROP INDEX IF EXISTS ix_precos_canonical_loja")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_precos_canonical_loja "
+        "ON precos (canonical_id, loja_id, data_coleta DESC)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_precos_canonical_loja")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_precos_canonical_loja ON precos (canonical_id, loja_id)")
@@ -0,0 +1,52 @@
+"""produtos_canonicos preco_atual
+
+Revision ID: f3a4b5c6d7e8
+Revises: e2f3a4b5c6d7
+Create Date: 2026-10-15 11:15:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f3a4b5c6d7e8"
+down_revision: Union[str, None] = "e2f3a4b5c6d7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE produtos_canonicos ADD COLUMN IF NOT EXISTS preco_atual DOUBLE PRECISION")
+    op.execute("ALTER TABLE produtos_canonicos ADD COLUMN IF NOT EXISTS preco_data TIMESTAMP WITH TIME ZONE")
+    op.execute(
+        "ALTER TABLE produtos_canonicos ADD COLUMN IF NOT EXISTS preco_loja_id INTEGER "
+        "REFERENCES lojas (id) ON DELETE SET NULL"
+    )
+
+    # Backfill: menor preço entre os mais recentes de cada loja (mesma regra de services/current_prices.py)
+    op.execute(
+        """
+        UPDATE produtos_canonicos AS c
+        SET preco_atual = b.preco_por_unidade, preco_data = b.data_coleta, preco_loja_id = b.loja_id
+        FROM (
+            SELECT DISTINCT ON (canonical_id) canonical_id, loja_id, preco_por_unidade, data_coleta
+            FROM (
+                SELECT DISTINCT ON (canonical_id, loja_id) canonical_id, loja_id, preco_por_unidade, data_coleta
+                FROM precos
+                WHERE canonical_id IS NOT NULL AND data_coleta IS NOT NULL
+                ORDER BY canonical_id, loja_id, data_coleta DESC, preco_por_unidade
+            ) AS latest
+            ORDER BY canonical_id, preco_por_unidade, data_coleta DESC
+        ) AS b
+        WHERE c.id = b.canonical_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE produtos_canonicos DROP COLUMN IF EXISTS preco_loja_id")
+    op.execute("ALTER TABLE produtos_canonicos DROP COLUMN IF EXISTS preco_data")
+    op.execute("ALTER TABLE produtos_canonicos DROP COLUMN IF EXISTS preco_atual")
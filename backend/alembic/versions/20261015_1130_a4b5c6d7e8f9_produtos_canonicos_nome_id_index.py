@@ -0,0 +1,27 @@
+"""produtos_canonicos nome id index
+
+Revision ID: a4b5c6d7e8f9
+Revises: f3a4b5c6d7e8
+Create Date: 2026-10-15 11:30:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4b5c6d7e8f9"
+down_revision: Union[str, None] = "f3a4b5c6d7e8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Paginação por cursor da listagem de canônicos: WHERE (nome, id) > (...) ORDER BY nome, id
+    op.execute("CREATE INDEX IF NOT EXISTS ix_canonicos_nome_id ON produtos_canonicos (nome, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_canonicos_nome_id")
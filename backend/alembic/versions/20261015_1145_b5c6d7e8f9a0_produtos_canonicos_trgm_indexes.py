@@ -0,0 +1,36 @@
+"""produtos_canonicos trgm indexes
+
+Revision ID: b5c6d7e8f9a0
+Revises: a4b5c6d7e8f9
+Create Date: 2026-10-15 11:45:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b5c6d7e8f9a0"
+down_revision: Union[str, None] = "a4b5c6d7e8f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Busca da listagem de canônicos: nome/marca ILIKE '%termo%' sem varredura sequencial
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_canonicos_nome_trgm "
+        "ON produtos_canonicos USING gin (nome gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_canonicos_marca_trgm "
+        "ON produtos_canonicos USING gin (marca gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_canonicos_marca_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_canonicos_nome_trgm")
@@ -0,0 +1,30 @@
+"""produtos_canonicos nome curto index
+
+Revision ID: c6d7e8f9a0b1
+Revises: b5c6d7e8f9a0
+Create Date: 2026-10-15 12:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c6d7e8f9a0b1"
+down_revision: Union[str, None] = "b5c6d7e8f9a0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # renormalize-batch: WHERE length(nome) < 20 ORDER BY id LIMIT n
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_canonicos_nome_curto "
+        "ON produtos_canonicos (id) WHERE length(nome) < 20"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_canonicos_nome_curto")
@@ -0,0 +1,34 @@
+"""canonical categories materialized view
+
+Revision ID: d7e8f9a0b1c2
+Revises: c6d7e8f9a0b1
+Create Date: 2026-10-15 12:15:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d7e8f9a0b1c2"
+down_revision: Union[str, None] = "c6d7e8f9a0b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS canonical_categories AS
+        SELECT DISTINCT categoria FROM produtos_canonicos
+        WHERE categoria IS NOT NULL AND categoria <> ''
+        """
+    )
+    # Índice único: requisito do REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_canonical_categories ON canonical_categories (categoria)")
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS canonical_categories")
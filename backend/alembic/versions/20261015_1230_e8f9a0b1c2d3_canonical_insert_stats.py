@@ -0,0 +1,50 @@
+"""canonical insert stats rollup
+
+Revision ID: e8f9a0b1c2d3
+Revises: d7e8f9a0b1c2
+Create Date: 2026-10-15 12:30:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8f9a0b1c2d3"
+down_revision: Union[str, None] = "d7e8f9a0b1c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS canonical_insert_stats (
+            canonical_id INTEGER PRIMARY KEY REFERENCES produtos_canonicos (id) ON DELETE CASCADE,
+            inserts INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_canonical_insert_stats_inserts "
+        "ON canonical_insert_stats (inserts DESC)"
+    )
+
+    # Carga inicial para os KPIs não começarem vazios
+    op.execute(
+        """
+        INSERT INTO canonical_insert_stats (canonical_id, inserts, updated_at)
+        SELECT canonical_id, COUNT(DISTINCT cupom_id), now()
+        FROM precos
+        WHERE canonical_id IS NOT NULL AND cupom_id IS NOT NULL
+        GROUP BY canonical_id
+        ON CONFLICT (canonical_id) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS canonical_insert_stats")
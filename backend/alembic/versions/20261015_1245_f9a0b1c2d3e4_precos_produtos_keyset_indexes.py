@@ -0,0 +1,34 @@
+"""precos produtos keyset indexes
+
+Revision ID: f9a0b1c2d3e4
+Revises: e8f9a0b1c2d3
+Create Date: 2026-10-15 12:45:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f9a0b1c2d3e4"
+down_revision: Union[str, None] = "e8f9a0b1c2d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Paginação por cursor de /prices (data_coleta DESC, id DESC) e /products (descricao_norm, id)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_precos_data_coleta_id ON precos (data_coleta DESC, id DESC)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_precos_produto_data_coleta_id "
+        "ON precos (produto_id, data_coleta DESC, id DESC)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_produtos_descricao_id ON produtos (descricao_norm, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_produtos_descricao_id")
+    op.execute("DROP INDEX IF EXISTS ix_precos_produto_data_coleta_id")
+    op.execute("DROP INDEX IF EXISTS ix_precos_data_coleta_id")
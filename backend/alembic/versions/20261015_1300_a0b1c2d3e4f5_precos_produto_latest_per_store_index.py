@@ -0,0 +1,32 @@
+"""precos produto latest per store index
+
+Revision ID: a0b1c2d3e4f5
+Revises: f9a0b1c2d3e4
+Create Date: 2026-10-15 13:00:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a0b1c2d3e4f5"
+down_revision: Union[str, None] = "f9a0b1c2d3e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # compare_prices: DISTINCT ON (loja_id) WHERE produto_id = ? ORDER BY loja_id, data_coleta DESC
+    op.execute("DROP INDEX IF EXISTS ix_precos_produto_loja")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_precos_produto_loja "
+        "ON precos (produto_id, loja_id, data_coleta DESC)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_precos_produto_loja")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_precos_produto_loja ON precos (produto_id, loja_id)")
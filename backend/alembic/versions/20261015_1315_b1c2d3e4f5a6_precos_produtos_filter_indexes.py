@@ -0,0 +1,49 @@
+"""precos/produtos filter indexes
+
+Revision ID: b1c2d3e4f5a6
+Revises: a0b1c2d3e4f5
+Create Date: 2026-10-15 13:15:00.000000+00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b1c2d3e4f5a6"
+down_revision: Union[str, None] = "a0b1c2d3e4f5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # list_prices?loja_id=...: WHERE loja_id = ? ORDER BY data_coleta DESC, id DESC (keyset)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_precos_loja_data_coleta_id "
+        "ON precos (loja_id, data_coleta DESC, id DESC)"
+    )
+
+    # list_products?search=...: ILIKE '%termo%' em descricao_norm OR gtin OR marca.
+    # O OR só vira BitmapOr se as três colunas tiverem índice trigram.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_produtos_descricao_trgm "
+        "ON produtos USING gin (descricao_norm gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_produtos_gtin_trgm "
+        "ON produtos USING gin (gtin gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_produtos_marca_trgm "
+        "ON produtos USING gin (marca gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_produtos_marca_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_produtos_gtin_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_produtos_descricao_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_precos_loja_data_coleta_id")
@@ -0,0 +1,56 @@
+"""Cache compartilhado entre workers (Redis) para respostas que mudam devagar.
+
+Falhas do Redis nunca derrubam a requisição: leitura vira miss e escrita é ignorada.
+"""
+
+import logging
+import threading
+from typing import Any, Optional
+
+import orjson
+from redis import Redis
+from redis.exceptions import RedisError
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[Redis] = None
+_client_lock = threading.Lock()
+
+
+def get_redis() -> Redis:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Timeouts curtos: o cache não pode ficar mais lento que a consulta que evita
+                _client = Redis.from_url(settings.redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+    return _client
+
+
+def cache_get_json(key: str) -> Any:
+    """Retorna o valor em cache (já desserializado) ou None."""
+    try:
+        raw = get_redis().get(key)
+    except RedisError as e:
+        logger.warning("Cache indisponível ao ler %s: %s", key, e)
+        return None
+    return orjson.loads(raw) if raw is not None else None
+
+
+def cache_set_json(key: str, value: Any, ttl: int) -> None:
+    """Grava o valor serializado com expiração (SETEX)."""
+    try:
+        get_redis().setex(key, ttl, orjson.dumps(value))
+    except RedisError as e:
+        logger.warning("Cache indisponível ao gravar %s: %s", key, e)
+
+
+def cache_delete(*keys: str) -> None:
+    if not keys:
+        return
+    try:
+        get_redis().delete(*keys)
+    except RedisError as e:
+        logger.warning("Cache indisponível ao invalidar %s: %s", ", ".join(keys), e)
@@ -3,8 +3,9 @@
 from collections.abc import Generator
 from typing import Annotated
 
+import orjson
 from fastapi import Depends
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from .config import settings
@@ -15,11 +16,24 @@ DATABASE_URL = settings.database_url
 
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=300,
-    connect_args={"client_encoding": "utf8"},
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_timeout=settings.db_pool_timeout,
+    # Cache de SQL compilado: as consultas parametrizadas das listagens compilam uma vez
+    query_cache_size=1200,
+    connect_args={
+        "client_encoding": "utf8",
+        # Keepalive TCP (libpq): conexão caída é detectada em ~1 min sem ping por checkout
+        "keepalives": 1,
+        "keepalives_idle": settings.db_keepalives_idle,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    },
+    # Colunas JSON/JSONB serializadas com orjson
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=orjson.loads,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,6 +45,19 @@ class Base(DeclarativeBase):
     pass
 
 
+def warm_up_pool(size: int) -> None:
+    """Abre `size` conexões no startup para que as primeiras requisições não paguem o handshake."""
+    conns = []
+    try:
+        for _ in range(max(0, size)):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+
+
 def get_db() -> Generator[Session, None, None]:
     """Dependency que fornece uma sessão do banco de dados."""
     db = SessionLocal()
@@ -0,0 +1,42 @@
+"""Helpers de ETag para listagens consultadas com frequência (If-None-Match -> 304)."""
+
+import hashlib
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Gera um ETag fraco a partir de uma "impressão digital" barata dos dados + parâmetros da consulta."""
+    digest = hashlib.blake2b(orjson.dumps(parts, default=str), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Indica se o cliente já possui a versão `etag` (header If-None-Match)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Comparação fraca: ignora o prefixo W/
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def json_response_with_etag(request: Request, content: Any, headers: dict[str, str] | None = None) -> Response:
+    """Serializa `content` com orjson e usa o hash do próprio corpo como ETag.
+
+    Para respostas montadas a partir de linhas já lidas (sem impressão digital
+    barata no banco): não poupa a consulta, mas o 304 poupa o corpo na rede.
+    `headers` (ex.: Cache-Control) vão também no 304.
+    """
+    body = orjson.dumps(content)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {**(headers or {}), "ETag": etag}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
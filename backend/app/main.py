@@ -4,6 +4,7 @@ import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
+import anyio.to_thread
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -14,7 +15,8 @@ from slowapi.util import get_remote_address
 from sqlalchemy import text
 
 from .config import settings
-from .database import Base, engine
+from .database import Base, engine, warm_up_pool
+from .pagination import NEXT_CURSOR_HEADER
 from app.routers import (
     auth,
     app_auth,
@@ -38,6 +40,7 @@ from app.routers import (
 )
 from app.routers.app_locations import router as app_locations
 from .schemas import HealthResponse
+from .services.auth import flush_audit_queue
 
 # === Logging ===
 
@@ -66,11 +69,26 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         logger.info("Ambiente de desenvolvimento: criando tabelas...")
         Base.metadata.create_all(bind=engine)
 
+    # Endpoints síncronos rodam no threadpool do AnyIO (40 threads por padrão): dimensiona para
+    # o máximo de conexões do pool, senão requisições esperam thread com conexões livres sobrando
+    anyio.to_thread.current_default_thread_limiter().total_tokens = max(
+        40, settings.db_pool_size + settings.db_max_overflow
+    )
+
+    try:
+        warm_up_pool(settings.db_pool_warmup)
+    except Exception as e:
+        logger.warning("Não foi possível pré-aquecer o pool de conexões: %s", e)
+
     logger.info("API iniciada com sucesso!")
     yield
 
     # Shutdown
     logger.info("Encerrando SmartListas API...")
+    flush_audit_queue()
+    await app_payments.close_mp_client()
+    await ocr.close_openai_client()
+    app_notifications_admin.close_expo_client()
 
 
 # === App ===
@@ -98,6 +116,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
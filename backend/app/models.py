@@ -4,6 +4,7 @@ from datetime import UTC, datetime
 from enum import Enum as PyEnum
 
 from sqlalchemy import (
+    DDL,
     Boolean,
     Column,
     DateTime,
@@ -11,11 +12,15 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    JSON,
     String,
     Text,
     Table,
     UniqueConstraint,
+    event,
+    func,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -73,6 +78,15 @@ class Role(Base):
     permissions = relationship("Permission", secondary=role_permissions, back_populates="roles")
     users = relationship("User", back_populates="role")
 
+    @property
+    def permission_codes(self) -> frozenset[str]:
+        """Códigos das permissões da role, memoizados por versão (updated_at)."""
+        cached = self.__dict__.get("_permission_codes")
+        if cached is None or cached[0] != self.updated_at:
+            cached = (self.updated_at, frozenset(p.code for p in self.permissions))
+            self.__dict__["_permission_codes"] = cached
+        return cached[1]
+
 
 class User(Base):
     """Modelo para usuários do sistema."""
@@ -106,20 +120,22 @@ class User(Base):
 
     __table_args__ = (
         Index("ix_users_email_active", "email", "is_active"),
+        # Unicidade de email sem diferenciar maiúsculas (checagem de cadastro)
+        Index("ix_users_email_lower", func.lower(email), unique=True),
     )
 
     def has_permission(self, permission_code: str) -> bool:
         """Verifica se o usuário tem uma permissão específica."""
         if not self.role:
             return False
-        return any(p.code == permission_code for p in self.role.permissions)
+        return permission_code in self.role.permission_codes
     
     def has_any_permission(self, *permission_codes: str) -> bool:
         """Verifica se o usuário tem qualquer uma das permissões."""
         if not self.role:
             return False
-        user_permissions = {p.code for p in self.role.permissions}
-        return bool(user_permissions.intersection(permission_codes))
+        codes = self.role.permission_codes
+        return any(code in codes for code in permission_codes)
 
 
 class UserSession(Base):
@@ -228,6 +244,8 @@ class AppUser(Base):
     referred_by_user_id = Column(Integer, ForeignKey("app_users.id", ondelete="SET NULL"), nullable=True, index=True)
     trial_ends_at = Column(DateTime(timezone=True), nullable=True, index=True)
     subscription_ends_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # Saldo materializado do ledger (mantido pelo trigger trg_app_credit_ledger_balance)
+    credit_balance_cents = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Preferências de notificação
     notification_enabled = Column(Boolean, default=True)
@@ -250,6 +268,10 @@ class AppUser(Base):
         Index("ix_app_users_email_active", "email", "is_active"),
         Index("ix_app_users_city_state", "city", "state"),
         Index("ix_app_users_referrer", "referred_by_user_id"),
+        # Filtros de audiência comparam lower(coluna) == valor
+        Index("ix_app_users_lower_state", func.lower(state)),
+        Index("ix_app_users_lower_city", func.lower(city)),
+        Index("ix_app_users_lower_gender", func.lower(gender)),
     )
 
 
@@ -295,6 +317,36 @@ class AppCreditLedger(Base):
     )
 
 
+# Mantém app_users.credit_balance_cents em sincronia com o ledger (Postgres)
+APP_CREDIT_LEDGER_BALANCE_TRIGGER = DDL(
+    """
+    CREATE OR REPLACE FUNCTION app_credit_ledger_apply_balance() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE app_users SET credit_balance_cents = credit_balance_cents - OLD.amount_cents
+            WHERE id = OLD.user_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE app_users SET credit_balance_cents = credit_balance_cents + NEW.amount_cents
+            WHERE id = NEW.user_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_app_credit_ledger_balance ON app_credit_ledger;
+    CREATE TRIGGER trg_app_credit_ledger_balance
+    AFTER INSERT OR DELETE OR UPDATE OF amount_cents, user_id ON app_credit_ledger
+    FOR EACH ROW EXECUTE FUNCTION app_credit_ledger_apply_balance();
+    """
+)
+event.listen(
+    AppCreditLedger.__table__,
+    "after_create",
+    APP_CREDIT_LEDGER_BALANCE_TRIGGER.execute_if(dialect="postgresql"),
+)
+
+
 class AppPayment(Base):
     """Pagamentos do app (assinatura), registrados a partir de provedores externos (ex: Mercado Pago)."""
 
@@ -319,13 +371,20 @@ class AppPayment(Base):
     created_at = Column(DateTime(timezone=True), default=utc_now, index=True)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
 
-    raw_payload = Column(Text, nullable=True)
+    raw_payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
 
     user = relationship("AppUser")
 
     __table_args__ = (
         UniqueConstraint("provider", "provider_payment_id", name="uq_app_payments_provider_payment"),
         Index("ix_app_payments_user_created", "user_id", "created_at"),
+        Index(
+            "ix_app_payments_status_created",
+            "status",
+            created_at.desc(),
+            postgresql_include=["provider", "user_id", "amount_cents"],
+        ),
+        Index("ix_app_payments_provider_created", "provider", created_at.desc()),
     )
 
 
@@ -390,6 +449,8 @@ class AppShoppingList(Base):
 
     __table_args__ = (
         Index("ix_app_shopping_lists_user_status", "user_id", "status"),
+        # Listagem do usuário ordenada por updated_at DESC
+        Index("ix_app_shopping_lists_user_updated", "user_id", updated_at.desc()),
     )
 
 
@@ -448,7 +509,7 @@ class AppPurchase(Base):
     items = relationship("AppPurchaseItem", back_populates="purchase", cascade="all, delete-orphan")
 
     __table_args__ = (
-        Index("ix_app_purchases_user_finished", "user_id", "finished_at"),
+        Index("ix_app_purchases_user_finished", "user_id", finished_at.desc(), id.desc()),
     )
 
 
@@ -505,8 +566,19 @@ class AppReceiptKeySubmission(Base):
     reviewed_by = relationship("User")
 
     __table_args__ = (
-        Index("ix_app_receipt_keys_user_created", "user_id", "created_at"),
+        Index("ix_app_receipt_keys_user_created", "user_id", created_at.desc(), id.desc()),
         Index("ix_app_receipt_keys_status", "status"),
+        Index(
+            "ix_app_receipt_keys_pending_created",
+            created_at.desc(),
+            id.desc(),
+            postgresql_where=(status == "pending"),
+        ),
+        Index(
+            "ix_app_receipt_keys_chave_prefix",
+            "chave_acesso",
+            postgresql_ops={"chave_acesso": "varchar_pattern_ops"},
+        ),
         Index("ix_app_receipt_keys_purchase", "purchase_id"),
         Index("ix_app_receipt_keys_credited", "credited_at"),
     )
@@ -572,6 +644,12 @@ class CanonicalProduct(Base):
     unidade_padrao = Column(String(10), nullable=False, default="un")  # un, kg, l, ml, g
     quantidade_padrao = Column(Float, nullable=True)  # Ex: 420 (para 420g)
     gtin_principal = Column(String(32), nullable=True, unique=True, index=True)  # GTIN principal se houver
+
+    # Preço atual materializado (menor entre os mais recentes de cada loja), ver services/current_prices.py
+    preco_atual = Column(Float, nullable=True)
+    preco_data = Column(DateTime(timezone=True), nullable=True)
+    preco_loja_id = Column(Integer, ForeignKey("lojas.id", ondelete="SET NULL"), nullable=True)
+
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
 
@@ -581,10 +659,54 @@ class CanonicalProduct(Base):
 
     __table_args__ = (
         Index("ix_canonicos_nome_marca", "nome", "marca"),
+        Index("ix_canonicos_nome_id", "nome", "id"),  # keyset da listagem (ORDER BY nome, id)
+        # Candidatos do renormalize-batch (nomes curtos) em ordem de id, sem varrer a tabela
+        Index("ix_canonicos_nome_curto", "id", postgresql_where=(func.length(nome) < 20)),
         Index("ix_canonicos_categoria", "categoria"),
+        # ix_canonicos_nome_trgm / ix_canonicos_marca_trgm (GIN pg_trgm) só via migration: dependem da extensão
+    )
+
+
+
+class CanonicalInsertStat(Base):
+    """Rollup de cupons distintos por produto canônico (top_inserted dos KPIs).
+
+    Recalculado em background por services/canonical_insert_stats.py.
+    """
+
+    __tablename__ = "canonical_insert_stats"
+
+    canonical_id = Column(Integer, ForeignKey("produtos_canonicos.id", ondelete="CASCADE"), primary_key=True)
+    inserts = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+
+    __table_args__ = (
+        Index("ix_canonical_insert_stats_inserts", inserts.desc()),
     )
 
 
+# Categorias distintas para o filtro da listagem (ver services/canonical_categories.py)
+CANONICAL_CATEGORIES_VIEW = DDL(
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS canonical_categories AS
+    SELECT DISTINCT categoria FROM produtos_canonicos
+    WHERE categoria IS NOT NULL AND categoria <> '';
+
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_canonical_categories ON canonical_categories (categoria);
+    """
+)
+event.listen(
+    CanonicalProduct.__table__,
+    "after_create",
+    CANONICAL_CATEGORIES_VIEW.execute_if(dialect="postgresql"),
+)
+event.listen(
+    CanonicalProduct.__table__,
+    "before_drop",
+    DDL("DROP MATERIALIZED VIEW IF EXISTS canonical_categories").execute_if(dialect="postgresql"),
+)
+
+
 class ProductAlias(Base):
     """Modelo para aliases de produtos (descrições de cada loja)."""
 
@@ -631,6 +753,8 @@ class Product(Base):
 
     __table_args__ = (
         Index("ix_produtos_gtin_descricao", "gtin", "descricao_norm"),
+        Index("ix_produtos_descricao_id", "descricao_norm", "id"),  # keyset da listagem (ORDER BY descricao_norm, id)
+        # ix_produtos_{descricao,gtin,marca}_trgm (GIN pg_trgm) só via migration: dependem da extensão
     )
 
 
@@ -703,7 +827,7 @@ class Price(Base):
     loja_id = Column(Integer, ForeignKey("lojas.id"), nullable=False, index=True)
     preco_por_unidade = Column(Float, nullable=False)
     unidade_base = Column(String(10), default="un")
-    data_coleta = Column(DateTime(timezone=True), index=True, default=utc_now)
+    data_coleta = Column(DateTime(timezone=True), default=utc_now)  # índice: ix_precos_data_coleta (__table_args__)
     fonte = Column(String(30), default="cupom")
     cupom_id = Column(String(44), ForeignKey("cupons.chave_acesso"), nullable=True)
     created_at = Column(DateTime(timezone=True), default=utc_now)
@@ -715,9 +839,14 @@ class Price(Base):
     cupom = relationship("Receipt", back_populates="precos")
 
     __table_args__ = (
-        Index("ix_precos_canonical_loja", "canonical_id", "loja_id"),
-        Index("ix_precos_produto_loja", "produto_id", "loja_id"),
+        # Preço mais recente por loja (DISTINCT ON canonical_id, loja_id ... data_coleta DESC)
+        Index("ix_precos_canonical_loja", "canonical_id", "loja_id", data_coleta.desc()),
+        Index("ix_precos_produto_loja", "produto_id", "loja_id", data_coleta.desc()),
         Index("ix_precos_data_coleta", "data_coleta"),
+        # Keyset da listagem de preços: ORDER BY data_coleta DESC, id DESC (geral e por produto)
+        Index("ix_precos_data_coleta_id", data_coleta.desc(), id.desc()),
+        Index("ix_precos_produto_data_coleta_id", "produto_id", data_coleta.desc(), id.desc()),
+        Index("ix_precos_loja_data_coleta_id", "loja_id", data_coleta.desc(), id.desc()),
     )
 
 
@@ -0,0 +1,39 @@
+"""Helpers para paginação por cursor (keyset pagination)."""
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi import HTTPException
+
+# Header usado pelas listagens que retornam uma lista pura (sem envelope)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """Codifica os valores da chave de ordenação da última linha em um cursor opaco."""
+    raw = orjson.dumps(list(values))
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int = 2) -> list[Any]:
+    """Decodifica um cursor gerado por `encode_cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = orjson.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+
+def decode_datetime_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decodifica um cursor `(datetime, id)` usado nas listagens ordenadas por data."""
+    ts, row_id = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(ts), int(row_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
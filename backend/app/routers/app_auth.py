@@ -15,13 +15,13 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr, Field
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..database import get_db
 from ..models import AppBillingSettings, AppCreditLedger, AppUser, AppUserSession
+from ..services.credits import ledger_balance_cents
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -734,12 +734,7 @@ def get_app_user_billing_admin(
 
     s = _get_or_create_billing_settings(db)
 
-    balance = (
-        db.query(func.coalesce(func.sum(AppCreditLedger.amount_cents), 0))
-        .filter(AppCreditLedger.user_id == user.id)
-        .scalar()
-    )
-    balance = int(balance or 0)
+    balance = ledger_balance_cents(db, user.id)
     amount_due = max(int(s.monthly_price_cents) - balance, 0)
 
     return AppUserAdminBillingOut(
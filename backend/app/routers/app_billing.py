@@ -59,12 +59,7 @@ def billing_status(
 ):
     s = _get_or_create_settings(db)
 
-    balance = (
-        db.query(func.coalesce(func.sum(AppCreditLedger.amount_cents), 0))
-        .filter(AppCreditLedger.user_id == current_user.id)
-        .scalar()
-    )
-    balance = int(balance or 0)
+    balance = int(current_user.credit_balance_cents or 0)
 
     amount_due = max(int(s.monthly_price_cents) - balance, 0)
 
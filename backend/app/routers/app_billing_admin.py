@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import AppBillingSettings, User
+from ..services.billing_settings import invalidate_billing_settings_cache
+from ..services.credits import reconcile_credit_balances
 from .auth import get_current_user
 
 router = APIRouter()
@@ -24,6 +26,7 @@ def _get_or_create_settings(db: Session) -> AppBillingSettings:
     )
     db.add(settings)
     db.commit()
+    invalidate_billing_settings_cache()
     db.refresh(settings)
     return settings
 
@@ -76,5 +79,23 @@ def update_billing_settings(
     settings.is_active = bool(data.is_active)
 
     db.commit()
+    invalidate_billing_settings_cache()
     db.refresh(settings)
     return settings
+
+
+class CreditReconcileOut(BaseModel):
+    corrected_users: int
+
+
+@router.post("/admin/billing/reconcile-credits", response_model=CreditReconcileOut)
+def reconcile_credits(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Recalcula o saldo materializado (app_users.credit_balance_cents) a partir do ledger.
+
+    O saldo é mantido pelo trigger do ledger; rode após incidentes ou cargas manuais
+    no ledger para corrigir divergências. Retorna quantos usuários foram corrigidos.
+    """
+    return CreditReconcileOut(corrected_users=reconcile_credit_balances(db))
@@ -4,7 +4,6 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from ..database import get_db
@@ -42,6 +41,6 @@ def list_cities(uf: str, search: Optional[str] = None, limit: int = 50, db: Sess
         like = f"%{search.strip()}%"
         q = q.filter(CityLocation.city.ilike(like))
 
-    q = q.group_by(CityLocation.city).order_by(func.min(CityLocation.city).asc()).limit(limit)
+    q = q.distinct().order_by(CityLocation.city.asc()).limit(limit)
     rows = q.all()
     return [CityOut(city=r[0]) for r in rows]
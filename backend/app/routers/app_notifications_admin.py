@@ -6,6 +6,7 @@ from datetime import UTC, datetime
 from typing import Any, Dict, List, Literal, Optional
 
 import httpx
+import orjson
 from fastapi import APIRouter, Depends
 from fastapi import HTTPException
 from pydantic import BaseModel, Field
@@ -22,6 +23,28 @@ router = APIRouter()
 
 RULES_KEY = "smartlistas.notification_rules.v1"
 EXPO_PUSH_URL = "https://exp.host/--/api/v2/push/send"
+EXPO_PUSH_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip",
+    "Content-Type": "application/json",
+}
+
+_expo_client: Optional[httpx.Client] = None
+
+
+def _get_expo_client() -> httpx.Client:
+    """Cliente HTTP compartilhado com o Expo Push (reaproveita conexões TLS)."""
+    global _expo_client
+    if _expo_client is None or _expo_client.is_closed:
+        _expo_client = httpx.Client(timeout=20.0, limits=httpx.Limits(max_keepalive_connections=10))
+    return _expo_client
+
+
+def close_expo_client() -> None:
+    global _expo_client
+    if _expo_client is not None:
+        _expo_client.close()
+        _expo_client = None
 
 
 def _redis() -> Redis:
@@ -207,43 +230,43 @@ def send_notification(
     errors: Dict[str, int] = {}
     bad_tokens: List[str] = []
 
-    with httpx.Client(timeout=20.0) as client:
-        for i in range(0, len(messages), 100):
-            chunk = messages[i : i + 100]
-            res = client.post(EXPO_PUSH_URL, json=chunk)
-            if res.status_code >= 400:
-                failures += len(chunk)
-                continue
-            try:
-                data = res.json()
-                receipts = data.get("data") if isinstance(data, dict) else None
-                if isinstance(receipts, list):
-                    for idx, r in enumerate(receipts):
-                        if isinstance(r, dict) and r.get("status") == "ok":
-                            sent += 1
-                            continue
-
-                        failures += 1
-                        details = r.get("details") if isinstance(r, dict) else None
-                        err = None
-                        if isinstance(details, dict):
-                            err = details.get("error")
-                        if not err and isinstance(r, dict):
-                            err = r.get("message")
-                        key = str(err or "unknown")
-                        errors[key] = errors.get(key, 0) + 1
-
-                        # tentativa de limpar tokens inválidos
-                        if key in {"DeviceNotRegistered", "InvalidCredentials", "InvalidPushToken"}:
-                            # mapear token pelo índice do chunk
-                            try:
-                                bad_tokens.append(chunk[idx]["to"])
-                            except Exception:
-                                pass
-                else:
-                    sent += len(chunk)
-            except Exception:
+    client = _get_expo_client()
+    for i in range(0, len(messages), 100):
+        chunk = messages[i : i + 100]
+        res = client.post(EXPO_PUSH_URL, content=orjson.dumps(chunk), headers=EXPO_PUSH_HEADERS)
+        if res.status_code >= 400:
+            failures += len(chunk)
+            continue
+        try:
+            data = res.json()
+            receipts = data.get("data") if isinstance(data, dict) else None
+            if isinstance(receipts, list):
+                for idx, r in enumerate(receipts):
+                    if isinstance(r, dict) and r.get("status") == "ok":
+                        sent += 1
+                        continue
+
+                    failures += 1
+                    details = r.get("details") if isinstance(r, dict) else None
+                    err = None
+                    if isinstance(details, dict):
+                        err = details.get("error")
+                    if not err and isinstance(r, dict):
+                        err = r.get("message")
+                    key = str(err or "unknown")
+                    errors[key] = errors.get(key, 0) + 1
+
+                    # tentativa de limpar tokens inválidos
+                    if key in {"DeviceNotRegistered", "InvalidCredentials", "InvalidPushToken"}:
+                        # mapear token pelo índice do chunk
+                        try:
+                            bad_tokens.append(chunk[idx]["to"])
+                        except Exception:
+                            pass
+            else:
                 sent += len(chunk)
+        except Exception:
+            sent += len(chunk)
 
     if bad_tokens:
         try:
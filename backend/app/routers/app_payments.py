@@ -1,22 +1,23 @@
 from __future__ import annotations
 
-import json
 from datetime import UTC, datetime, timedelta
 from uuid import uuid4
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from ..config import Settings, settings
 from ..database import get_db
-from ..models import AppBillingSettings, AppCreditLedger, AppPayment, AppUser
+from ..models import AppCreditLedger, AppPayment, AppUser
+from ..services.billing_settings import get_cached_billing_settings
 from .app_auth import get_current_app_user
 
 router = APIRouter()
 
+_mp_client: httpx.AsyncClient | None = None
+
 
 def _mp_settings() -> Settings:
     s = settings
@@ -25,32 +26,28 @@ def _mp_settings() -> Settings:
     return Settings()
 
 
-def _get_or_create_settings(db: Session) -> AppBillingSettings:
-    s = db.query(AppBillingSettings).order_by(AppBillingSettings.id.asc()).first()
-    if s:
-        return s
-    s = AppBillingSettings(
-        trial_days=30,
-        monthly_price_cents=1500,
-        referral_credit_cents=200,
-        receipt_credit_cents=100,
-        referral_credit_limit_per_month=5,
-        receipt_credit_limit_per_month=5,
-        is_active=True,
-    )
-    db.add(s)
-    db.commit()
-    db.refresh(s)
-    return s
+def _get_mp_client() -> httpx.AsyncClient:
+    """Cliente HTTP compartilhado com o Mercado Pago (reaproveita conexões TLS)."""
+    global _mp_client
+    if _mp_client is None or _mp_client.is_closed:
+        _mp_client = httpx.AsyncClient(
+            base_url=_mp_settings().mp_base_url,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+    return _mp_client
 
 
-def _credit_balance_cents(db: Session, user_id: int) -> int:
-    balance = (
-        db.query(func.coalesce(func.sum(AppCreditLedger.amount_cents), 0))
-        .filter(AppCreditLedger.user_id == user_id)
-        .scalar()
-    )
-    return int(balance or 0)
+async def close_mp_client() -> None:
+    global _mp_client
+    if _mp_client is not None:
+        await _mp_client.aclose()
+        _mp_client = None
+
+
+def _credit_balance_cents(user: AppUser) -> int:
+    # Saldo materializado em app_users (POST /admin/billing/reconcile-credits corrige divergências pelo ledger)
+    return int(user.credit_balance_cents or 0)
 
 
 def _extend_subscription(user: AppUser, now: datetime, days: int) -> tuple[datetime, datetime]:
@@ -88,10 +85,10 @@ async def create_pix_checkout(
     if not mp_settings.mp_access_token:
         raise HTTPException(status_code=500, detail="Mercado Pago não configurado")
 
-    s = _get_or_create_settings(db)
-    monthly_price_cents = int(s.monthly_price_cents)
+    s = get_cached_billing_settings(db)
+    monthly_price_cents = s.monthly_price_cents
 
-    balance = _credit_balance_cents(db, current_user.id)
+    balance = _credit_balance_cents(current_user)
     credits_applied = min(balance, monthly_price_cents)
     amount_due_cents = max(monthly_price_cents - credits_applied, 0)
 
@@ -112,7 +109,7 @@ async def create_pix_checkout(
             approved_at=now,
             period_start=period_start,
             period_end=period_end,
-            raw_payload=json.dumps({"reason": "amount_due_zero"}),
+            raw_payload={"reason": "amount_due_zero"},
         )
         db.add(payment)
 
@@ -159,8 +156,7 @@ async def create_pix_checkout(
         "X-Idempotency-Key": idem_key,
     }
 
-    async with httpx.AsyncClient(base_url=mp_settings.mp_base_url, timeout=10.0) as client:
-        resp = await client.post("/v1/payments", headers=headers, json=payload)
+    resp = await _get_mp_client().post("/v1/payments", headers=headers, json=payload)
 
     if resp.status_code >= 400:
         raise HTTPException(status_code=502, detail=f"Erro Mercado Pago: {resp.text}")
@@ -179,7 +175,7 @@ async def create_pix_checkout(
         credits_applied_cents=int(credits_applied),
         currency="BRL",
         description=data.description,
-        raw_payload=json.dumps({"idempotency_key": idem_key, "mp": mp}),
+        raw_payload={"idempotency_key": idem_key, "mp": mp},
         created_at=now,
     )
     db.add(payment)
@@ -203,8 +199,7 @@ async def create_pix_checkout(
 async def _fetch_mp_payment(payment_id: str) -> dict:
     mp_settings = _mp_settings()
     headers = {"Authorization": f"Bearer {mp_settings.mp_access_token}"}
-    async with httpx.AsyncClient(base_url=mp_settings.mp_base_url, timeout=10.0) as client:
-        resp = await client.get(f"/v1/payments/{payment_id}", headers=headers)
+    resp = await _get_mp_client().get(f"/v1/payments/{payment_id}", headers=headers)
     if resp.status_code >= 400:
         raise HTTPException(status_code=502, detail=f"Erro Mercado Pago: {resp.text}")
     return resp.json()
@@ -253,17 +248,15 @@ async def _sync_mp_payment(db: Session, payment_id: str) -> SyncOut:
             credits_applied_cents=0,
             currency=str(mp.get("currency_id") or "BRL"),
             description=str(mp.get("description") or ""),
-            raw_payload=json.dumps(mp),
+            raw_payload=mp,
             created_at=datetime.now(UTC),
         )
         db.add(payment)
-        db.commit()
-        db.refresh(payment)
+        db.flush()
 
     renewed = False
     payment.status = status
-    payment.raw_payload = json.dumps(mp)
-    db.commit()
+    payment.raw_payload = mp
 
     if status == "approved" and payment.approved_at is None:
         now = datetime.now(UTC)
@@ -288,9 +281,10 @@ async def _sync_mp_payment(db: Session, payment_id: str) -> SyncOut:
             payment.approved_at = now
             payment.period_start = period_start
             payment.period_end = period_end
-            db.commit()
             renewed = True
 
+    db.commit()
+
     user = db.get(AppUser, payment.user_id)
     return SyncOut(
         ok=True,
@@ -3,12 +3,13 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
-from sqlalchemy import desc, func
+from sqlalchemy import case, desc, func, tuple_
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from ..pagination import decode_datetime_cursor, encode_cursor
 from ..models import AppPayment, AppUser, User
 from .auth import get_current_user
 from .app_payments import _sync_mp_payment
@@ -44,6 +45,7 @@ class AppPaymentOut(BaseModel):
 class PaymentsListOut(BaseModel):
     items: List[AppPaymentOut]
     total: int
+    next_cursor: str | None = None
 
 
 class PaymentsKpisOut(BaseModel):
@@ -58,6 +60,7 @@ class PaymentsKpisOut(BaseModel):
 
 @router.get("/admin/payments", response_model=PaymentsListOut)
 def list_app_payments_admin(
+    response: Response,
     status: Optional[str] = None,
     provider: Optional[str] = None,
     user_id: Optional[int] = None,
@@ -66,6 +69,7 @@ def list_app_payments_admin(
     end_date: Optional[datetime] = None,
     page: int = 1,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -76,36 +80,50 @@ def list_app_payments_admin(
     if limit > 200:
         limit = 200
 
-    q = db.query(AppPayment, AppUser.email, AppUser.name).join(AppUser, AppUser.id == AppPayment.user_id)
-
+    filters = []
     if status:
-        q = q.filter(AppPayment.status == status)
+        filters.append(AppPayment.status == status)
     if provider:
-        q = q.filter(AppPayment.provider == provider)
+        filters.append(AppPayment.provider == provider)
     if user_id:
-        q = q.filter(AppPayment.user_id == user_id)
+        filters.append(AppPayment.user_id == user_id)
     if search:
         s = f"%{search.strip()}%"
-        q = q.filter(
+        filters.append(
             (AppUser.email.ilike(s))
             | (AppUser.name.ilike(s))
             | (AppPayment.provider_payment_id.ilike(s))
         )
 
     if start_date:
-        q = q.filter(AppPayment.created_at >= start_date)
+        filters.append(AppPayment.created_at >= start_date)
     if end_date:
-        q = q.filter(AppPayment.created_at <= end_date)
-
-    total = q.with_entities(func.count(AppPayment.id)).scalar() or 0
+        filters.append(AppPayment.created_at <= end_date)
 
-    rows = (
-        q.order_by(desc(AppPayment.created_at))
-        .offset((page - 1) * limit)
-        .limit(limit)
-        .all()
+    q = (
+        db.query(AppPayment, AppUser.email, AppUser.name)
+        .join(AppUser, AppUser.id == AppPayment.user_id)
+        .filter(*filters)
     )
 
+    # Só a busca textual referencia AppUser; sem ela o COUNT dispensa o JOIN
+    count_q = db.query(func.count(AppPayment.id))
+    if search:
+        count_q = count_q.join(AppUser, AppUser.id == AppPayment.user_id)
+    total = count_q.filter(*filters).scalar() or 0
+
+    q = q.order_by(desc(AppPayment.created_at), desc(AppPayment.id))
+    if cursor:
+        # Keyset: busca direto após a última linha da página anterior
+        cursor_ts, cursor_id = decode_datetime_cursor(cursor)
+        q = q.filter(tuple_(AppPayment.created_at, AppPayment.id) < (cursor_ts, cursor_id))
+    elif page > 1:
+        # Paginação por OFFSET mantida por compatibilidade; prefira `cursor`
+        q = q.offset((page - 1) * limit)
+        response.headers["Deprecation"] = "true"
+
+    rows = q.limit(limit).all()
+
     items: List[AppPaymentOut] = []
     for p, email, name in rows:
         items.append(
@@ -129,7 +147,12 @@ def list_app_payments_admin(
             )
         )
 
-    return PaymentsListOut(items=items, total=int(total))
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return PaymentsListOut(items=items, total=int(total), next_cursor=next_cursor)
 
 
 @router.get("/admin/payments/kpis", response_model=PaymentsKpisOut)
@@ -143,7 +166,12 @@ def get_app_payments_kpis_admin(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    q = db.query(AppPayment).join(AppUser, AppUser.id == AppPayment.user_id)
+    q = db.query(
+        AppPayment.id,
+        AppPayment.status,
+        AppPayment.amount_cents,
+        AppPayment.credits_applied_cents,
+    ).join(AppUser, AppUser.id == AppPayment.user_id)
 
     if status:
         q = q.filter(AppPayment.status == status)
@@ -163,27 +191,27 @@ def get_app_payments_kpis_admin(
     if end_date:
         q = q.filter(AppPayment.created_at <= end_date)
 
-    total_count = q.with_entities(func.count(AppPayment.id)).scalar() or 0
-    total_amount_cents = q.with_entities(func.coalesce(func.sum(AppPayment.amount_cents), 0)).scalar() or 0
-    total_credits_applied_cents = (
-        q.with_entities(func.coalesce(func.sum(AppPayment.credits_applied_cents), 0)).scalar() or 0
-    )
-
-    approved_count = q.filter(AppPayment.status == "approved").with_entities(func.count(AppPayment.id)).scalar() or 0
-    approved_amount_cents = (
-        q.filter(AppPayment.status == "approved")
-        .with_entities(func.coalesce(func.sum(AppPayment.amount_cents), 0))
-        .scalar()
-        or 0
-    )
-
-    pending_count = q.filter(AppPayment.status == "pending").with_entities(func.count(AppPayment.id)).scalar() or 0
-    pending_amount_cents = (
-        q.filter(AppPayment.status == "pending")
-        .with_entities(func.coalesce(func.sum(AppPayment.amount_cents), 0))
-        .scalar()
-        or 0
-    )
+    # Agrega tudo em uma única consulta sobre as colunas estritamente necessárias
+    base = q.subquery()
+    is_approved = base.c.status == "approved"
+    is_pending = base.c.status == "pending"
+    (
+        total_count,
+        total_amount_cents,
+        total_credits_applied_cents,
+        approved_count,
+        approved_amount_cents,
+        pending_count,
+        pending_amount_cents,
+    ) = db.query(
+        func.count(base.c.id),
+        func.coalesce(func.sum(base.c.amount_cents), 0),
+        func.coalesce(func.sum(base.c.credits_applied_cents), 0),
+        func.coalesce(func.sum(case((is_approved, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((is_approved, base.c.amount_cents), else_=0)), 0),
+        func.coalesce(func.sum(case((is_pending, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((is_pending, base.c.amount_cents), else_=0)), 0),
+    ).one()
 
     return PaymentsKpisOut(
         total_count=int(total_count),
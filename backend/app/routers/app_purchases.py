@@ -4,17 +4,22 @@ import logging
 from datetime import UTC, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, load_only, selectinload
 
 from ..database import get_db
+from ..etag import etag_matches, make_etag, not_modified
 from ..models import AppPurchase, AppPurchaseItem, AppReceiptKeySubmission, AppUser
+from ..pagination import NEXT_CURSOR_HEADER, decode_datetime_cursor, encode_cursor
 from ..schemas import extract_chave_from_text
 from .app_auth import get_current_app_user
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 class PurchaseItemIn(BaseModel):
@@ -69,10 +74,35 @@ class PurchaseOut(BaseModel):
         from_attributes = True
 
 
-@router.get("/purchases", response_model=List[PurchaseOut])
+def _purchase_to_dict(p: AppPurchase) -> dict:
+    return {
+        "id": p.id,
+        "local_list_id": p.local_list_id,
+        "list_name": p.list_name,
+        "status_final": p.status_final,
+        "finished_at": p.finished_at,
+        "receipt_chave_acesso": p.receipt_chave_acesso,
+        "items": [
+            {
+                "id": it.id,
+                "canonical_id": it.canonical_id,
+                "product_name_snapshot": it.product_name_snapshot,
+                "quantity": it.quantity,
+                "unit": it.unit,
+                "is_checked": it.is_checked,
+            }
+            for it in p.items
+        ],
+    }
+
+
+# Listagem quente: serializa direto com orjson, sem revalidar via response_model.
+@router.get("/purchases", response_model=None, responses={200: {"model": List[PurchaseOut]}})
 def list_purchases(
+    request: Request,
     page: int = 1,
     page_size: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
@@ -83,15 +113,53 @@ def list_purchases(
     if page_size > 50:
         page_size = 50
 
+    # Compras não são editadas depois de criadas: quantidade + maior id identificam o estado
+    fingerprint = (
+        db.query(func.count(AppPurchase.id), func.max(AppPurchase.id))
+        .filter(AppPurchase.user_id == current_user.id)
+        .one()
+    )
+    etag = make_etag(current_user.id, page, page_size, cursor, *fingerprint)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     q = (
         db.query(AppPurchase)
         .filter(AppPurchase.user_id == current_user.id)
-        .options(joinedload(AppPurchase.items))
-        .order_by(AppPurchase.finished_at.desc())
+        .options(
+            # Não traz receipt_qr_raw (texto livre do QR), que não é exposto na listagem
+            load_only(
+                AppPurchase.id,
+                AppPurchase.local_list_id,
+                AppPurchase.list_name,
+                AppPurchase.status_final,
+                AppPurchase.finished_at,
+                AppPurchase.receipt_chave_acesso,
+            ),
+            selectinload(AppPurchase.items).load_only(
+                AppPurchaseItem.id,
+                AppPurchaseItem.canonical_id,
+                AppPurchaseItem.product_name_snapshot,
+                AppPurchaseItem.quantity,
+                AppPurchaseItem.unit,
+                AppPurchaseItem.is_checked,
+            ),
+        )
+        .order_by(AppPurchase.finished_at.desc(), AppPurchase.id.desc())
     )
 
-    purchases = q.offset((page - 1) * page_size).limit(page_size).all()
-    return purchases
+    if cursor:
+        cursor_ts, cursor_id = decode_datetime_cursor(cursor)
+        q = q.filter(tuple_(AppPurchase.finished_at, AppPurchase.id) < (cursor_ts, cursor_id))
+    else:
+        q = q.offset((page - 1) * page_size)
+
+    purchases = q.limit(page_size).all()
+    headers = {"ETag": etag}
+    if len(purchases) == page_size:
+        last = purchases[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last.finished_at, last.id)
+    return ORJSONResponse([_purchase_to_dict(p) for p in purchases], headers=headers)
 
 
 @router.post("/purchases", response_model=PurchaseCreateOut, status_code=status.HTTP_201_CREATED)
@@ -119,39 +187,42 @@ def create_purchase(
     db.flush()
 
     if chave:
-        existing = db.query(AppReceiptKeySubmission).filter(AppReceiptKeySubmission.chave_acesso == chave).first()
-        if existing:
-            if existing.purchase_id is None:
-                existing.purchase_id = purchase.id
-            if existing.user_id != current_user.id:
-                existing.user_id = current_user.id
-            if not existing.raw_text:
-                existing.raw_text = data.receipt_qr_raw
-        else:
-            db.add(
-                AppReceiptKeySubmission(
-                    user_id=current_user.id,
-                    purchase_id=purchase.id,
-                    chave_acesso=chave,
-                    raw_text=data.receipt_qr_raw,
-                    source="qr",
-                    status="pending",
-                )
-            )
-
-    for it in data.items:
-        db.add(
-            AppPurchaseItem(
-                purchase_id=purchase.id,
-                canonical_id=it.canonical_id,
-                product_name_snapshot=it.product_name_snapshot,
-                quantity=it.quantity,
-                unit=it.unit,
-                is_checked=it.is_checked,
-            )
+        # Upsert atômico pela chave (índice único): evita corrida entre leitura e insert
+        stmt = pg_insert(AppReceiptKeySubmission).values(
+            user_id=current_user.id,
+            purchase_id=purchase.id,
+            chave_acesso=chave,
+            raw_text=data.receipt_qr_raw,
+            source="qr",
+            status="pending",
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AppReceiptKeySubmission.chave_acesso],
+            set_={
+                "purchase_id": func.coalesce(AppReceiptKeySubmission.purchase_id, stmt.excluded.purchase_id),
+                "user_id": stmt.excluded.user_id,
+                "raw_text": func.coalesce(func.nullif(AppReceiptKeySubmission.raw_text, ""), stmt.excluded.raw_text),
+            },
         )
+        db.execute(stmt)
+
+    # Um único INSERT multi-linha (executemany) para o snapshot dos itens
+    db.execute(
+        insert(AppPurchaseItem),
+        [
+            {
+                "purchase_id": purchase.id,
+                "canonical_id": it.canonical_id,
+                "product_name_snapshot": it.product_name_snapshot,
+                "quantity": it.quantity,
+                "unit": it.unit,
+                "is_checked": it.is_checked,
+            }
+            for it in data.items
+        ],
+    )
 
+    purchase_id = purchase.id
     db.commit()
-    db.refresh(purchase)
 
-    return PurchaseCreateOut(id=purchase.id, receipt_chave_acesso=purchase.receipt_chave_acesso)
+    return PurchaseCreateOut(id=purchase_id, receipt_chave_acesso=chave)
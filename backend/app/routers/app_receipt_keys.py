@@ -8,12 +8,15 @@ import logging
 from datetime import UTC, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, load_only
 
 from ..database import get_db
 from ..models import AppReceiptKeySubmission, AppUser
+from ..pagination import NEXT_CURSOR_HEADER, decode_datetime_cursor, encode_cursor
 from ..schemas import extract_chave_from_text
 from .app_auth import get_current_app_user
 
@@ -46,15 +49,35 @@ class ReceiptKeyCreateOut(BaseModel):
 
 @router.get("/receipt-keys", response_model=List[ReceiptKeyOut])
 def list_receipt_keys(
+    response: Response,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
+    limit = 50
     q = (
         db.query(AppReceiptKeySubmission)
+        .options(
+            load_only(
+                AppReceiptKeySubmission.id,
+                AppReceiptKeySubmission.chave_acesso,
+                AppReceiptKeySubmission.source,
+                AppReceiptKeySubmission.status,
+                AppReceiptKeySubmission.created_at,
+            )
+        )
         .filter(AppReceiptKeySubmission.user_id == current_user.id)
-        .order_by(AppReceiptKeySubmission.created_at.desc())
+        .order_by(AppReceiptKeySubmission.created_at.desc(), AppReceiptKeySubmission.id.desc())
     )
-    return q.limit(50).all()
+    if cursor:
+        cursor_ts, cursor_id = decode_datetime_cursor(cursor)
+        q = q.filter(tuple_(AppReceiptKeySubmission.created_at, AppReceiptKeySubmission.id) < (cursor_ts, cursor_id))
+
+    rows = q.limit(limit).all()
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
 
 
 @router.post("/receipt-keys", response_model=ReceiptKeyCreateOut, status_code=status.HTTP_201_CREATED)
@@ -72,22 +95,35 @@ def create_receipt_key(
     if not chave:
         raise HTTPException(status_code=400, detail="Não foi possível extrair chave de acesso (44 dígitos).")
 
-    existing = db.query(AppReceiptKeySubmission).filter(AppReceiptKeySubmission.chave_acesso == chave).first()
-    if existing:
-        # Se já existir, apenas retorna (evita duplicidade global)
-        return ReceiptKeyCreateOut(id=existing.id, status=existing.status, message="Chave já foi enviada anteriormente")
-
-    row = AppReceiptKeySubmission(
-        user_id=current_user.id,
-        chave_acesso=chave,
-        raw_text=(data.raw_text or data.chave_acesso),
-        source=(data.source or "manual")[:20],
-        status="pending",
-        created_at=datetime.now(UTC),
+    # Envio de chave não precisa esperar o fsync do WAL: a linha fica visível na hora e,
+    # numa queda do servidor, o pior caso é o usuário reenviar a chave.
+    db.execute(text("SET LOCAL synchronous_commit TO OFF"))
+
+    # INSERT ... ON CONFLICT DO NOTHING: um round trip no caso comum e sem corrida com envios simultâneos
+    stmt = (
+        pg_insert(AppReceiptKeySubmission)
+        .values(
+            user_id=current_user.id,
+            chave_acesso=chave,
+            raw_text=(data.raw_text or data.chave_acesso),
+            source=(data.source or "manual")[:20],
+            status="pending",
+            created_at=datetime.now(UTC),
+        )
+        .on_conflict_do_nothing(index_elements=[AppReceiptKeySubmission.chave_acesso])
+        .returning(AppReceiptKeySubmission.id, AppReceiptKeySubmission.status)
     )
-    db.add(row)
+    inserted = db.execute(stmt).first()
     db.commit()
-    db.refresh(row)
+
+    if not inserted:
+        # Se já existir, apenas retorna (evita duplicidade global)
+        existing = (
+            db.query(AppReceiptKeySubmission.id, AppReceiptKeySubmission.status)
+            .filter(AppReceiptKeySubmission.chave_acesso == chave)
+            .first()
+        )
+        return ReceiptKeyCreateOut(id=existing.id, status=existing.status, message="Chave já foi enviada anteriormente")
 
     logger.info("AppUser %s enviou chave %s", current_user.id, chave)
-    return ReceiptKeyCreateOut(id=row.id, status=row.status, message="Chave enviada com sucesso")
+    return ReceiptKeyCreateOut(id=inserted.id, status=inserted.status, message="Chave enviada com sucesso")
@@ -4,42 +4,26 @@ Protegido por autenticação do usuário do painel (User).
 """
 
 import logging
+import re
 from datetime import UTC, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import case, false, func, tuple_, update
+from sqlalchemy.orm import Session, load_only
 
 from ..database import get_db
-from ..models import AppBillingSettings, AppCreditLedger, AppReceiptKeySubmission, User
+from ..etag import etag_matches, make_etag, not_modified
+from ..models import AppCreditLedger, AppReceiptKeySubmission, User
+from ..pagination import NEXT_CURSOR_HEADER, decode_datetime_cursor, encode_cursor
+from ..services.billing_settings import get_cached_billing_settings
+from ..services.credits import monthly_entry_count, note_monthly_entry
 from .auth import get_current_user
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
-
-
-def _get_or_create_settings(db: Session) -> AppBillingSettings:
-    s = db.query(AppBillingSettings).order_by(AppBillingSettings.id.asc()).first()
-    if s:
-        return s
-    s = AppBillingSettings(
-        trial_days=30,
-        monthly_price_cents=1500,
-        referral_credit_cents=200,
-        receipt_credit_cents=100,
-        referral_credit_limit_per_month=5,
-        receipt_credit_limit_per_month=5,
-        is_active=True,
-    )
-    db.add(s)
-    db.commit()
-    db.refresh(s)
-    return s
-
-
-def _month_start(now: datetime) -> datetime:
-    return datetime(now.year, now.month, 1, tzinfo=UTC)
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 class ReceiptKeyAdminOut(BaseModel):
@@ -64,10 +48,28 @@ class ReceiptKeyAdminUpdateIn(BaseModel):
     notes: Optional[str] = Field(default=None, max_length=255)
 
 
-@router.get("/admin/receipt-keys", response_model=List[ReceiptKeyAdminOut])
+def _receipt_key_to_dict(sub: AppReceiptKeySubmission) -> dict:
+    return {
+        "id": sub.id,
+        "user_id": sub.user_id,
+        "purchase_id": sub.purchase_id,
+        "chave_acesso": sub.chave_acesso,
+        "raw_text": sub.raw_text,
+        "source": sub.source,
+        "status": sub.status,
+        "created_at": sub.created_at,
+        "reviewed_at": sub.reviewed_at,
+        "reviewed_by_user_id": sub.reviewed_by_user_id,
+        "notes": sub.notes,
+    }
+
+
+@router.get("/admin/receipt-keys", response_model=None, responses={200: {"model": List[ReceiptKeyAdminOut]}})
 def list_receipt_keys_admin(
+    request: Request,
     page: int = 1,
     limit: int = 50,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
@@ -80,17 +82,69 @@ def list_receipt_keys_admin(
     if limit > 200:
         limit = 200
 
-    q = db.query(AppReceiptKeySubmission)
-
+    filters = []
     if status:
-        q = q.filter(AppReceiptKeySubmission.status == status)
+        filters.append(AppReceiptKeySubmission.status == status)
 
     if search:
-        term = f"%{search.strip()}%"
-        q = q.filter(AppReceiptKeySubmission.chave_acesso.ilike(term))
+        # Chave é numérica: busca por prefixo dos dígitos (usa o índice varchar_pattern_ops)
+        term = re.sub(r"\D", "", search)
+        if term:
+            filters.append(AppReceiptKeySubmission.chave_acesso.like(f"{term}%"))
+        else:
+            # Busca sem dígitos (ex.: um nome) não casa com nenhuma chave: lista vazia, não a fila inteira
+            filters.append(false())
+
+    # Impressão digital do conjunto filtrado: novos envios (id), revisões (reviewed_at)
+    # e vínculo com compra (purchase_id só passa de NULL para um valor)
+    fingerprint = (
+        db.query(
+            func.count(AppReceiptKeySubmission.id),
+            func.max(AppReceiptKeySubmission.id),
+            func.max(AppReceiptKeySubmission.reviewed_at),
+            func.coalesce(func.sum(AppReceiptKeySubmission.purchase_id), 0),
+        )
+        .filter(*filters)
+        .one()
+    )
+    etag = make_etag(page, limit, cursor, status, search, *fingerprint)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Apenas as colunas expostas em ReceiptKeyAdminOut
+    q = (
+        db.query(AppReceiptKeySubmission)
+        .options(
+            load_only(
+                AppReceiptKeySubmission.id,
+                AppReceiptKeySubmission.user_id,
+                AppReceiptKeySubmission.purchase_id,
+                AppReceiptKeySubmission.chave_acesso,
+                AppReceiptKeySubmission.raw_text,
+                AppReceiptKeySubmission.source,
+                AppReceiptKeySubmission.status,
+                AppReceiptKeySubmission.created_at,
+                AppReceiptKeySubmission.reviewed_at,
+                AppReceiptKeySubmission.reviewed_by_user_id,
+                AppReceiptKeySubmission.notes,
+            )
+        )
+        .filter(*filters)
+    )
+
+    q = q.order_by(AppReceiptKeySubmission.created_at.desc(), AppReceiptKeySubmission.id.desc())
+    if cursor:
+        cursor_ts, cursor_id = decode_datetime_cursor(cursor)
+        q = q.filter(tuple_(AppReceiptKeySubmission.created_at, AppReceiptKeySubmission.id) < (cursor_ts, cursor_id))
+    else:
+        q = q.offset((page - 1) * limit)
 
-    q = q.order_by(AppReceiptKeySubmission.created_at.desc())
-    return q.offset((page - 1) * limit).limit(limit).all()
+    rows = q.limit(limit).all()
+    headers = {"ETag": etag}
+    if len(rows) == limit:
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return ORJSONResponse([_receipt_key_to_dict(r) for r in rows], headers=headers)
 
 
 @router.put("/admin/receipt-keys/{submission_id}", response_model=ReceiptKeyAdminOut)
@@ -100,30 +154,41 @@ def update_receipt_key_admin(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    row = db.get(AppReceiptKeySubmission, submission_id)
+    now = datetime.now(UTC)
+    new_status = (data.status or "pending")[:20]
+
+    values = {
+        "status": new_status,
+        "notes": (data.notes or None),
+        "reviewed_at": now,
+        "reviewed_by_user_id": current_user.id,
+    }
+    if new_status == "processed":
+        # Só preenche na primeira vez (o CASE também impede crédito duplo com dois operadores ao mesmo tempo)
+        values["credited_at"] = case(
+            (AppReceiptKeySubmission.credited_at.is_(None), now),
+            else_=AppReceiptKeySubmission.credited_at,
+        )
+
+    # Um único UPDATE ... RETURNING (sem SELECT antes nem refresh depois)
+    row = db.execute(
+        update(AppReceiptKeySubmission)
+        .where(AppReceiptKeySubmission.id == submission_id)
+        .values(**values)
+        .returning(
+            *AppReceiptKeySubmission.__table__.c,
+            # reviewed_at e credited_at só coincidem quando este UPDATE acabou de creditar
+            (AppReceiptKeySubmission.credited_at == AppReceiptKeySubmission.reviewed_at).label("just_credited"),
+        )
+    ).first()
     if not row:
         raise HTTPException(status_code=404, detail="Registro não encontrado")
 
-    prev_status = row.status
-    row.status = (data.status or "pending")[:20]
-    row.notes = (data.notes or None)
-    row.reviewed_at = datetime.now(UTC)
-    row.reviewed_by_user_id = current_user.id
-
     # Credita cupom quando o operador marca como processed
-    if row.status == "processed" and row.credited_at is None:
-        s = _get_or_create_settings(db)
-        now = datetime.now(UTC)
-        start = _month_start(now)
-        used = (
-            db.query(AppCreditLedger)
-            .filter(
-                AppCreditLedger.user_id == row.user_id,
-                AppCreditLedger.entry_type == "receipt",
-                AppCreditLedger.created_at >= start,
-            )
-            .count()
-        )
+    credited = False
+    if row.just_credited:
+        s = get_cached_billing_settings(db)
+        used = monthly_entry_count(db, row.user_id, "receipt", now)
         if used < int(s.receipt_credit_limit_per_month):
             db.add(
                 AppCreditLedger(
@@ -135,8 +200,9 @@ def update_receipt_key_admin(
                     created_at=now,
                 )
             )
-        row.credited_at = now
+            credited = True
 
     db.commit()
-    db.refresh(row)
-    return row
+    if credited:
+        note_monthly_entry(row.user_id, "receipt", now)
+    return _receipt_key_to_dict(row)
@@ -5,18 +5,22 @@ from datetime import datetime
 from dataclasses import dataclass
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from ..database import get_db
+from ..etag import etag_matches, make_etag, not_modified
 from ..models import AppShoppingList, AppShoppingListItem, AppUser, CanonicalProduct, Store
 from .app_auth import get_current_app_user
 from ..services.app_shopping_optimizer import AppShoppingOptimizer
 from ..services.city_location import resolve_city_centroid
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 # =============================================================================
@@ -140,14 +144,15 @@ class AppOptimizationIn(BaseModel):
     items: List[AppOptimizationItemIn] = Field(default_factory=list)
 
 
-@dataclass
+# Estruturas leves (sem __dict__) que imitam AppShoppingList/Item para o otimizador
+@dataclass(slots=True, frozen=True)
 class _TempItem:
     id: int
     canonical_id: int
     quantity: float
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class _TempList:
     items: list[_TempItem]
 
@@ -157,23 +162,29 @@ class _TempList:
 # =============================================================================
 
 
-def _list_to_out(sl: AppShoppingList) -> AppShoppingListOut:
-    return AppShoppingListOut(
-        id=sl.id,
-        name=sl.name,
-        description=sl.description,
-        status=sl.status,
-        max_stores=sl.max_stores,
-        latitude=sl.latitude,
-        longitude=sl.longitude,
-        radius_km=sl.radius_km,
-        total_estimated=sl.total_estimated,
-        total_savings=sl.total_savings,
-        optimized_at=sl.optimized_at,
-        items_count=len(sl.items),
-        created_at=sl.created_at,
-        updated_at=sl.updated_at,
-    )
+def _list_to_dict(sl: AppShoppingList, items_count: Optional[int] = None) -> dict:
+    if items_count is None:
+        items_count = len(sl.items)
+    return {
+        "id": sl.id,
+        "name": sl.name,
+        "description": sl.description,
+        "status": sl.status,
+        "max_stores": sl.max_stores,
+        "latitude": sl.latitude,
+        "longitude": sl.longitude,
+        "radius_km": sl.radius_km,
+        "total_estimated": sl.total_estimated,
+        "total_savings": sl.total_savings,
+        "optimized_at": sl.optimized_at,
+        "items_count": int(items_count),
+        "created_at": sl.created_at,
+        "updated_at": sl.updated_at,
+    }
+
+
+def _list_to_out(sl: AppShoppingList, items_count: Optional[int] = None) -> AppShoppingListOut:
+    return AppShoppingListOut(**_list_to_dict(sl, items_count))
 
 
 def _item_to_out(item: AppShoppingListItem) -> AppShoppingListItemOut:
@@ -194,18 +205,41 @@ def _item_to_out(item: AppShoppingListItem) -> AppShoppingListItemOut:
 # =============================================================================
 
 
-@router.get("/shopping-lists", response_model=List[AppShoppingListOut])
+@router.get("/shopping-lists", response_model=None, responses={200: {"model": List[AppShoppingListOut]}})
 def list_app_shopping_lists(
+    request: Request,
     status_filter: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
-    query = db.query(AppShoppingList).filter(AppShoppingList.user_id == current_user.id)
+    # Impressão digital barata (listas + itens do usuário) para responder 304 em polling
+    fp_query = (
+        db.query(
+            func.count(func.distinct(AppShoppingList.id)),
+            func.max(AppShoppingList.updated_at),
+            func.count(AppShoppingListItem.id),
+            func.coalesce(func.sum(AppShoppingListItem.id), 0),
+        )
+        .outerjoin(AppShoppingListItem, AppShoppingListItem.shopping_list_id == AppShoppingList.id)
+        .filter(AppShoppingList.user_id == current_user.id)
+    )
+    if status_filter:
+        fp_query = fp_query.filter(AppShoppingList.status == status_filter)
+    etag = make_etag(current_user.id, status_filter, *fp_query.one())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Contagem de itens agregada no banco (sem carregar as linhas dos itens)
+    query = (
+        db.query(AppShoppingList, func.count(AppShoppingListItem.id).label("items_count"))
+        .outerjoin(AppShoppingListItem, AppShoppingListItem.shopping_list_id == AppShoppingList.id)
+        .filter(AppShoppingList.user_id == current_user.id)
+    )
     if status_filter:
         query = query.filter(AppShoppingList.status == status_filter)
 
-    lists = query.order_by(AppShoppingList.updated_at.desc()).options(joinedload(AppShoppingList.items)).all()
-    return [_list_to_out(sl) for sl in lists]
+    rows = query.group_by(AppShoppingList.id).order_by(AppShoppingList.updated_at.desc()).all()
+    return ORJSONResponse([_list_to_dict(sl, items_count) for sl, items_count in rows], headers={"ETag": etag})
 
 
 @router.post("/shopping-lists", response_model=AppShoppingListOut, status_code=status.HTTP_201_CREATED)
@@ -226,33 +260,51 @@ def create_app_shopping_list(
     )
 
     db.add(sl)
-    db.commit()
-    db.refresh(sl)
+    db.flush()
 
-    sl.items = []
-    return _list_to_out(sl)
+    # Defaults (id, timestamps) já estão no objeto após o flush: monta a resposta antes do commit
+    out = _list_to_out(sl, items_count=0)
+    db.commit()
+    return out
 
 
-@router.get("/shopping-lists/{list_id}", response_model=AppShoppingListDetailOut)
+@router.get(
+    "/shopping-lists/{list_id}", response_model=None, responses={200: {"model": AppShoppingListDetailOut}}
+)
 def get_app_shopping_list(
     list_id: int,
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
-    sl = (
-        db.query(AppShoppingList)
+    # Itens + nome do produto montados como JSON pelo próprio Postgres (json_agg), sem hidratar ORM
+    item_json = func.json_build_object(
+        "id", AppShoppingListItem.id,
+        "canonical_id", AppShoppingListItem.canonical_id,
+        "product_name", func.coalesce(CanonicalProduct.nome, "Produto"),
+        "quantity", AppShoppingListItem.quantity,
+        "unit", AppShoppingListItem.unit,
+        "notes", AppShoppingListItem.notes,
+        "is_checked", AppShoppingListItem.is_checked,
+    )
+    items_json = (
+        select(func.coalesce(func.json_agg(aggregate_order_by(item_json, AppShoppingListItem.id)), text("'[]'::json")))
+        .select_from(AppShoppingListItem)
+        .outerjoin(CanonicalProduct, CanonicalProduct.id == AppShoppingListItem.canonical_id)
+        .where(AppShoppingListItem.shopping_list_id == AppShoppingList.id)
+        .scalar_subquery()
+    )
+
+    row = (
+        db.query(AppShoppingList, items_json.label("items"))
         .filter(AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id)
-        .options(joinedload(AppShoppingList.items).joinedload(AppShoppingListItem.canonical_product))
         .first()
     )
 
-    if not sl:
+    if not row:
         raise HTTPException(status_code=404, detail="Lista não encontrada")
 
-    return AppShoppingListDetailOut(
-        **_list_to_out(sl).model_dump(),
-        items=[_item_to_out(it) for it in sl.items],
-    )
+    sl, items = row
+    return ORJSONResponse({**_list_to_dict(sl, len(items)), "items": items})
 
 
 @router.put("/shopping-lists/{list_id}", response_model=AppShoppingListOut)
@@ -262,34 +314,24 @@ def update_app_shopping_list(
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
-    sl = (
-        db.query(AppShoppingList)
-        .filter(AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id)
-        .options(joinedload(AppShoppingList.items))
-        .first()
-    )
+    # UPDATE ... WHERE id AND user_id RETURNING: checa posse e atualiza em um round trip
+    patch = data.model_dump(exclude_none=True)
+    owned = (AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id)
+    if patch:
+        stmt = update(AppShoppingList).where(*owned).values(**patch).returning(AppShoppingList)
+        sl = db.execute(stmt).scalar_one_or_none()
+    else:
+        sl = db.query(AppShoppingList).filter(*owned).first()
     if not sl:
         raise HTTPException(status_code=404, detail="Lista não encontrada")
 
-    if data.name is not None:
-        sl.name = data.name
-    if data.description is not None:
-        sl.description = data.description
-    if data.max_stores is not None:
-        sl.max_stores = data.max_stores
-    if data.latitude is not None:
-        sl.latitude = data.latitude
-    if data.longitude is not None:
-        sl.longitude = data.longitude
-    if data.radius_km is not None:
-        sl.radius_km = data.radius_km
-    if data.status is not None:
-        sl.status = data.status
-
+    items_count = (
+        db.query(func.count(AppShoppingListItem.id)).filter(AppShoppingListItem.shopping_list_id == list_id).scalar()
+    )
+    out = _list_to_out(sl, items_count)
     db.commit()
-    db.refresh(sl)
 
-    return _list_to_out(sl)
+    return out
 
 
 @router.delete("/shopping-lists/{list_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -298,11 +340,13 @@ def delete_app_shopping_list(
     db: Session = Depends(get_db),
     current_user: AppUser = Depends(get_current_app_user),
 ):
-    sl = db.query(AppShoppingList).filter(AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id).first()
-    if not sl:
+    # DELETE direto com filtro de posse; os itens saem pelo ON DELETE CASCADE da FK
+    result = db.execute(
+        delete(AppShoppingList).where(AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id)
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Lista não encontrada")
 
-    db.delete(sl)
     db.commit()
     return None
 
@@ -384,6 +428,11 @@ def optimize_local_payload(
             items_without_price=[it.canonical_id for it in data.items],
         )
 
+    # Índice item_id -> preços, montado uma vez para evitar varreduras O(itens × preços)
+    prices_by_item: dict[int, list] = {}
+    for ip in item_prices:
+        prices_by_item.setdefault(ip.item_id, []).append(ip)
+
     allocations, items_outside_item_ids = optimizer._greedy_allocate(item_prices, int(data.max_stores))
     total_cost = float(sum(a.total for a in allocations))
     total_if_single_store = float(optimizer._calculate_single_store_cost(item_prices))
@@ -426,9 +475,14 @@ def optimize_local_payload(
         (potential_savings / total_worst_cost * 100) if total_worst_cost > 0 and potential_savings > 0 else 0.0
     )
 
-    canonical_ids = [it.canonical_id for it in temp.items]
-    products = db.query(CanonicalProduct).filter(CanonicalProduct.id.in_(canonical_ids)).all()
-    name_by_id = {p.id: p.nome for p in products}
+    # Endereços faltantes: busca todas as lojas necessárias em uma única consulta
+    missing_address_store_ids = [a.store_id for a in allocations if not a.store_address]
+    address_by_store_id: dict[int, str] = {}
+    if missing_address_store_ids:
+        for store_id, endereco, cidade in (
+            db.query(Store.id, Store.endereco, Store.cidade).filter(Store.id.in_(missing_address_store_ids)).all()
+        ):
+            address_by_store_id[store_id] = ", ".join(p for p in [endereco, cidade] if p)
 
     allocations_out: list[AppStoreAllocationOut] = []
     for alloc in allocations:
@@ -438,18 +492,14 @@ def optimize_local_payload(
                 AppOptimizedItemOut(
                     item_id=ip.item_id,
                     canonical_id=ip.canonical_id,
-                    product_name=name_by_id.get(ip.canonical_id, "Produto"),
+                    product_name=ip.product_name,
                     quantity=ip.quantity,
                     price=ip.price,
                     subtotal=ip.subtotal,
                 )
             )
 
-        store = db.get(Store, alloc.store_id)
-        store_address = alloc.store_address
-        if store and not store_address:
-            parts = [p for p in [store.endereco, store.cidade] if p]
-            store_address = ", ".join(parts)
+        store_address = alloc.store_address or address_by_store_id.get(alloc.store_id, alloc.store_address)
 
         allocations_out.append(
             AppStoreAllocationOut(
@@ -461,15 +511,15 @@ def optimize_local_payload(
             )
         )
 
-    items_with_recent_price = {ip.canonical_id for ip in item_prices}
-    items_without_price = [it.canonical_id for it in temp.items if it.canonical_id not in items_with_recent_price]
+    # item_id == canonical_id na lista temporária
+    items_without_price = [it.canonical_id for it in temp.items if it.id not in prices_by_item]
 
     outside_canonical_ids = sorted(set(int(x) for x in items_outside_item_ids))
 
     # Preços para itens que têm preço recente mas ficaram fora dos supermercados selecionados.
     unoptimized_prices: list[AppFallbackPriceOut] = []
     for item_id in items_outside_item_ids:
-        candidates = [ip for ip in item_prices if ip.item_id == item_id]
+        candidates = prices_by_item.get(item_id)
         if not candidates:
             continue
         best = min(candidates, key=lambda x: x.price)
@@ -539,37 +589,40 @@ def add_app_shopping_list_item(
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
-    existing = (
-        db.query(AppShoppingListItem)
-        .filter(AppShoppingListItem.shopping_list_id == list_id, AppShoppingListItem.canonical_id == data.canonical_id)
-        .options(joinedload(AppShoppingListItem.canonical_product))
-        .first()
-    )
-
-    if existing:
-        existing.quantity += data.quantity
-        if data.unit:
-            existing.unit = data.unit
-        if data.notes is not None:
-            existing.notes = data.notes
-        db.commit()
-        db.refresh(existing)
-        return _item_to_out(existing)
-
-    item = AppShoppingListItem(
+    # Upsert atômico: soma a quantidade se o produto já está na lista (sem corrida entre toques repetidos)
+    stmt = pg_insert(AppShoppingListItem).values(
         shopping_list_id=list_id,
         canonical_id=data.canonical_id,
         quantity=data.quantity,
         unit=data.unit,
         notes=data.notes,
     )
-
-    db.add(item)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AppShoppingListItem.shopping_list_id, AppShoppingListItem.canonical_id],
+        set_={
+            "quantity": AppShoppingListItem.quantity + stmt.excluded.quantity,
+            "unit": func.coalesce(func.nullif(stmt.excluded.unit, ""), AppShoppingListItem.unit),
+            "notes": func.coalesce(stmt.excluded.notes, AppShoppingListItem.notes),
+        },
+    ).returning(
+        AppShoppingListItem.id,
+        AppShoppingListItem.quantity,
+        AppShoppingListItem.unit,
+        AppShoppingListItem.notes,
+        AppShoppingListItem.is_checked,
+    )
+    row = db.execute(stmt).one()
     db.commit()
-    db.refresh(item)
 
-    item = db.query(AppShoppingListItem).options(joinedload(AppShoppingListItem.canonical_product)).get(item.id)
-    return _item_to_out(item)
+    return AppShoppingListItemOut(
+        id=row.id,
+        canonical_id=data.canonical_id,
+        product_name=product.nome,
+        quantity=row.quantity,
+        unit=row.unit,
+        notes=row.notes,
+        is_checked=row.is_checked,
+    )
 
 
 @router.put("/shopping-lists/{list_id}/items/{item_id}", response_model=AppShoppingListItemOut)
@@ -644,7 +697,7 @@ def optimize_app_shopping_list(
     sl = (
         db.query(AppShoppingList)
         .filter(AppShoppingList.id == list_id, AppShoppingList.user_id == current_user.id)
-        .options(joinedload(AppShoppingList.items).joinedload(AppShoppingListItem.canonical_product))
+        .options(selectinload(AppShoppingList.items))
         .first()
     )
     if not sl:
@@ -661,13 +714,11 @@ def optimize_app_shopping_list(
     for alloc in result.allocations:
         items_out: list[AppOptimizedItemOut] = []
         for ip in alloc.items:
-            item = next((it for it in sl.items if it.id == ip.item_id), None)
-            product_name = item.canonical_product.nome if item and item.canonical_product else "Produto"
             items_out.append(
                 AppOptimizedItemOut(
                     item_id=ip.item_id,
                     canonical_id=ip.canonical_id,
-                    product_name=product_name,
+                    product_name=ip.product_name,
                     quantity=ip.quantity,
                     price=ip.price,
                     subtotal=ip.subtotal,
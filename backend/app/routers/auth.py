@@ -2,26 +2,31 @@
 
 import json
 import logging
+import threading
 from typing import List, Optional
 
+from cachetools import LRUCache, TTLCache
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, EmailStr, Field
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from sqlalchemy import delete, exists, func, insert, select
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 
 from ..database import DbSession
-from ..models import Permission, Role, User
+from ..models import Permission, Role, User, role_permissions, utc_now
 from ..services.auth import (
     AuthService,
-    AuditService,
+    enqueue_audit,
     decode_token,
     seed_roles_and_permissions,
     create_initial_admin,
 )
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 limiter = Limiter(key_func=get_remote_address)
 security = HTTPBearer(auto_error=False)
 
@@ -160,6 +165,51 @@ LoginResponse.model_rebuild()
 UserOut.model_rebuild()
 
 
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+# Permissões só mudam no seed (setup); TTL cobre os demais workers
+_permissions_cache: TTLCache = TTLCache(maxsize=1, ttl=60)
+_permissions_lock = threading.Lock()
+
+# (role_id, role.updated_at) -> (RoleOut em dict, códigos de permissão); updated_at muda quando as permissões mudam
+_role_out_cache: LRUCache = LRUCache(maxsize=64)
+_role_out_lock = threading.Lock()
+
+
+def _role_out_and_codes(role: Role) -> tuple[dict, tuple[str, ...]]:
+    key = (role.id, role.updated_at)
+    with _role_out_lock:
+        cached = _role_out_cache.get(key)
+    if cached is not None:
+        return cached
+
+    cached = (
+        {"id": role.id, "name": role.name, "display_name": role.display_name, "level": role.level},
+        tuple(p.code for p in role.permissions),
+    )
+    with _role_out_lock:
+        _role_out_cache[key] = cached
+    return cached
+
+
+def _user_to_dict(user: User) -> dict:
+    """Monta o UserOut já serializável, sem passar pelo pydantic (dados vêm do banco)."""
+    role_out, codes = _role_out_and_codes(user.role) if user.role else (None, ())
+    return {
+        "id": user.id,
+        "email": user.email,
+        "nome": user.nome,
+        "telefone": user.telefone,
+        "avatar_url": user.avatar_url,
+        "is_active": user.is_active,
+        "is_verified": user.is_verified,
+        "role": role_out,
+        "permissions": list(codes),
+    }
+
+
 # =============================================================================
 # DEPENDÊNCIAS
 # =============================================================================
@@ -235,17 +285,16 @@ def require_permission(*permissions: str):
 # ENDPOINTS DE AUTENTICAÇÃO
 # =============================================================================
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=None, responses={200: {"model": LoginResponse}})
 @limiter.limit("10/minute")
 def login(request: Request, data: LoginRequest, db: DbSession):
     """Autentica um usuário e retorna tokens."""
     auth_service = AuthService(db)
-    audit_service = AuditService(db)
     
     user = auth_service.authenticate(data.email, data.password)
     
     if not user:
-        audit_service.log(
+        enqueue_audit(
             action="login_failed",
             details=json.dumps({"email": data.email}),
             ip_address=request.client.host if request.client else None,
@@ -264,36 +313,19 @@ def login(request: Request, data: LoginRequest, db: DbSession):
     )
     
     # Log de auditoria
-    audit_service.log(
+    enqueue_audit(
         action="login",
         user_id=user.id,
         ip_address=request.client.host if request.client else None,
         user_agent=request.headers.get("user-agent")
     )
     
-    # Monta resposta
-    permissions = [p.code for p in user.role.permissions] if user.role else []
-    
-    return LoginResponse(
-        access_token=access_token,
-        refresh_token=refresh_token,
-        user=UserOut(
-            id=user.id,
-            email=user.email,
-            nome=user.nome,
-            telefone=user.telefone,
-            avatar_url=user.avatar_url,
-            is_active=user.is_active,
-            is_verified=user.is_verified,
-            role=RoleOut(
-                id=user.role.id,
-                name=user.role.name,
-                display_name=user.role.display_name,
-                level=user.role.level
-            ) if user.role else None,
-            permissions=permissions
-        )
-    )
+    return ORJSONResponse({
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "user": _user_to_dict(user),
+    })
 
 
 @router.post("/refresh", response_model=TokenResponse)
@@ -337,8 +369,7 @@ def logout(
         auth_service.logout(session_id, user_id)
         
         # Log de auditoria
-        audit_service = AuditService(db)
-        audit_service.log(
+        enqueue_audit(
             action="logout",
             user_id=user_id,
             ip_address=request.client.host if request.client else None
@@ -358,8 +389,7 @@ def logout_all(
     count = auth_service.logout_all(user.id)
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="logout_all",
         user_id=user.id,
         details=json.dumps({"sessions_invalidated": count}),
@@ -369,27 +399,10 @@ def logout_all(
     return {"message": f"{count} sessões encerradas"}
 
 
-@router.get("/me", response_model=UserOut)
+@router.get("/me", response_model=None, responses={200: {"model": UserOut}})
 def get_me(user: User = Depends(get_current_user)):
     """Retorna os dados do usuário autenticado."""
-    permissions = [p.code for p in user.role.permissions] if user.role else []
-    
-    return UserOut(
-        id=user.id,
-        email=user.email,
-        nome=user.nome,
-        telefone=user.telefone,
-        avatar_url=user.avatar_url,
-        is_active=user.is_active,
-        is_verified=user.is_verified,
-        role=RoleOut(
-            id=user.role.id,
-            name=user.role.name,
-            display_name=user.role.display_name,
-            level=user.role.level
-        ) if user.role else None,
-        permissions=permissions
-    )
+    return ORJSONResponse(_user_to_dict(user))
 
 
 @router.put("/me/password")
@@ -412,8 +425,7 @@ def change_password(
     auth_service.update_password(user, data.new_password)
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="password_changed",
         user_id=user.id
     )
@@ -425,38 +437,25 @@ def change_password(
 # ENDPOINTS DE GERENCIAMENTO DE USUÁRIOS
 # =============================================================================
 
-@router.get("/users", response_model=List[UserOut])
+@router.get("/users", response_model=None, responses={200: {"model": List[UserOut]}})
 def list_users(
     db: DbSession,
     user: User = Depends(require_permission("users.view"))
 ):
     """Lista todos os usuários."""
-    users = db.query(User).order_by(User.nome).all()
-    
-    result = []
-    for u in users:
-        permissions = [p.code for p in u.role.permissions] if u.role else []
-        result.append(UserOut(
-            id=u.id,
-            email=u.email,
-            nome=u.nome,
-            telefone=u.telefone,
-            avatar_url=u.avatar_url,
-            is_active=u.is_active,
-            is_verified=u.is_verified,
-            role=RoleOut(
-                id=u.role.id,
-                name=u.role.name,
-                display_name=u.role.display_name,
-                level=u.role.level
-            ) if u.role else None,
-            permissions=permissions
-        ))
-    
-    return result
-
-
-@router.post("/users", response_model=UserOut, status_code=status.HTTP_201_CREATED)
+    users = (
+        db.query(User)
+        .options(joinedload(User.role).selectinload(Role.permissions), raiseload("*"))
+        .order_by(User.nome)
+        .all()
+    )
+    
+    return ORJSONResponse([_user_to_dict(u) for u in users])
+
+
+@router.post(
+    "/users", response_model=None, responses={201: {"model": UserOut}}, status_code=status.HTTP_201_CREATED
+)
 def create_user(
     request: Request,
     data: UserCreate,
@@ -465,8 +464,10 @@ def create_user(
 ):
     """Cria um novo usuário."""
     # Verifica se email já existe
-    existing = db.query(User).filter(User.email == data.email.lower()).first()
-    if existing:
+    email_taken = db.query(
+        db.query(User.id).filter(func.lower(User.email) == data.email.lower()).exists()
+    ).scalar()
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email já cadastrado"
@@ -498,8 +499,7 @@ def create_user(
     )
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="user_created",
         user_id=current_user.id,
         resource_type="user",
@@ -507,27 +507,10 @@ def create_user(
         ip_address=request.client.host if request.client else None
     )
     
-    permissions = [p.code for p in user.role.permissions] if user.role else []
-    
-    return UserOut(
-        id=user.id,
-        email=user.email,
-        nome=user.nome,
-        telefone=user.telefone,
-        avatar_url=user.avatar_url,
-        is_active=user.is_active,
-        is_verified=user.is_verified,
-        role=RoleOut(
-            id=user.role.id,
-            name=user.role.name,
-            display_name=user.role.display_name,
-            level=user.role.level
-        ) if user.role else None,
-        permissions=permissions
-    )
+    return ORJSONResponse(_user_to_dict(user), status_code=status.HTTP_201_CREATED)
 
 
-@router.put("/users/{user_id}", response_model=UserOut)
+@router.put("/users/{user_id}", response_model=None, responses={200: {"model": UserOut}})
 def update_user(
     request: Request,
     user_id: int,
@@ -569,8 +552,7 @@ def update_user(
     db.refresh(user)
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="user_updated",
         user_id=current_user.id,
         resource_type="user",
@@ -578,24 +560,7 @@ def update_user(
         ip_address=request.client.host if request.client else None
     )
     
-    permissions = [p.code for p in user.role.permissions] if user.role else []
-    
-    return UserOut(
-        id=user.id,
-        email=user.email,
-        nome=user.nome,
-        telefone=user.telefone,
-        avatar_url=user.avatar_url,
-        is_active=user.is_active,
-        is_verified=user.is_verified,
-        role=RoleOut(
-            id=user.role.id,
-            name=user.role.name,
-            display_name=user.role.display_name,
-            level=user.role.level
-        ) if user.role else None,
-        permissions=permissions
-    )
+    return ORJSONResponse(_user_to_dict(user))
 
 
 @router.delete("/users/{user_id}")
@@ -627,8 +592,7 @@ def delete_user(
     db.commit()
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="user_deleted",
         user_id=current_user.id,
         resource_type="user",
@@ -643,25 +607,25 @@ def delete_user(
 # ENDPOINTS DE ROLES
 # =============================================================================
 
-@router.get("/roles", response_model=List[RoleOut])
+@router.get("/roles", response_model=None, responses={200: {"model": List[RoleOut]}})
 def list_roles(db: DbSession, user: User = Depends(get_current_user)):
     """Lista todas as roles disponíveis."""
-    roles = db.query(Role).order_by(Role.level.desc()).all()
-    return [
-        RoleOut(
-            id=r.id,
-            name=r.name,
-            display_name=r.display_name,
-            level=r.level
-        )
-        for r in roles
-    ]
+    rows = db.query(Role.id, Role.name, Role.display_name, Role.level).order_by(Role.level.desc()).all()
+    return ORJSONResponse([
+        {"id": r.id, "name": r.name, "display_name": r.display_name, "level": r.level}
+        for r in rows
+    ])
 
 
 @router.get("/roles/full", response_model=List[RoleFullOut])
 def list_roles_full(db: DbSession, user: User = Depends(require_permission("users.manage_roles"))):
     """Lista todas as roles com suas permissões."""
-    roles = db.query(Role).order_by(Role.level.desc()).all()
+    roles = (
+        db.query(Role)
+        .options(selectinload(Role.permissions), raiseload("*"))
+        .order_by(Role.level.desc())
+        .all()
+    )
     return [
         RoleFullOut(
             id=r.id,
@@ -705,16 +669,23 @@ def update_role_permissions(
             detail="Não é possível editar role com nível superior ao seu"
         )
     
-    # Busca as permissões
-    permissions = db.query(Permission).filter(Permission.id.in_(data.permission_ids)).all()
-    
-    # Atualiza
-    role.permissions = permissions
+    # Busca as permissões (só id e código)
+    permissions = db.execute(
+        select(Permission.id, Permission.code).where(Permission.id.in_(data.permission_ids))
+    ).all()
+    
+    # Substitui o conjunto inteiro em dois comandos (updated_at marca nova versão da role para o cache)
+    db.execute(delete(role_permissions).where(role_permissions.c.role_id == role_id))
+    if permissions:
+        db.execute(
+            insert(role_permissions),
+            [{"role_id": role_id, "permission_id": p.id} for p in permissions],
+        )
+    role.updated_at = utc_now()
     db.commit()
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="role_permissions_updated",
         user_id=current_user.id,
         resource_type="role",
@@ -726,31 +697,44 @@ def update_role_permissions(
     return {"message": "Permissões atualizadas", "count": len(permissions)}
 
 
-@router.get("/permissions", response_model=List[PermissionOut])
+@router.get("/permissions", response_model=None, responses={200: {"model": List[PermissionOut]}})
 def list_permissions(db: DbSession, user: User = Depends(require_permission("users.manage_roles"))):
     """Lista todas as permissões disponíveis."""
-    permissions = db.query(Permission).order_by(Permission.module, Permission.code).all()
-    return [
-        PermissionOut(
-            id=p.id,
-            code=p.code,
-            name=p.name,
-            description=p.description,
-            module=p.module
-        )
-        for p in permissions
-    ]
+    with _permissions_lock:
+        content = _permissions_cache.get("all")
+    if content is None:
+        rows = db.execute(
+            select(Permission.id, Permission.code, Permission.name, Permission.description, Permission.module)
+            .order_by(Permission.module, Permission.code)
+        ).all()
+        content = [
+            {"id": r[0], "code": r[1], "name": r[2], "description": r[3], "module": r[4]}
+            for r in rows
+        ]
+        with _permissions_lock:
+            _permissions_cache["all"] = content
+    return ORJSONResponse(content)
 
 
 # =============================================================================
 # SETUP INICIAL
 # =============================================================================
 
+# Depois que existe usuário o sistema nunca volta a precisar de setup
+_setup_done = False
+
+
 @router.get("/setup/status")
 def setup_status(db: DbSession):
     """Verifica se o sistema precisa de setup inicial."""
-    has_users = db.query(User).first() is not None
-    has_roles = db.query(Role).first() is not None
+    global _setup_done
+    if _setup_done:
+        return {"needs_setup": False, "has_roles": True, "has_users": True}
+
+    has_users, has_roles = db.execute(
+        select(exists().where(User.id.is_not(None)), exists().where(Role.id.is_not(None)))
+    ).one()
+    _setup_done = bool(has_users and has_roles)
     
     return {
         "needs_setup": not has_users,
@@ -764,7 +748,7 @@ def setup_status(db: DbSession):
 def setup(request: Request, data: SetupRequest, db: DbSession):
     """Configura o primeiro usuário administrador."""
     # Verifica se já existe usuário
-    if db.query(User).first():
+    if db.query(User.id).first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Sistema já configurado"
@@ -772,6 +756,8 @@ def setup(request: Request, data: SetupRequest, db: DbSession):
     
     # Cria roles e permissões
     seed_roles_and_permissions(db)
+    with _permissions_lock:
+        _permissions_cache.clear()
     
     # Cria admin
     user = create_initial_admin(db, data.email, data.password, data.nome)
@@ -783,8 +769,7 @@ def setup(request: Request, data: SetupRequest, db: DbSession):
         )
     
     # Log de auditoria
-    audit_service = AuditService(db)
-    audit_service.log(
+    enqueue_audit(
         action="system_setup",
         user_id=user.id,
         ip_address=request.client.host if request.client else None
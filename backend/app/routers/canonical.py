@@ -1,22 +1,35 @@
 """Router para operações com produtos canônicos."""
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
 
 from fastapi import APIRouter, HTTPException, Query, Request
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, field_validator
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import func
+from sqlalchemy import delete, func, select, tuple_, update
 
+from ..cache import cache_delete, cache_get_json, cache_set_json
+from ..config import settings
 from ..database import DbSession
-from ..models import CanonicalProduct, Price, ProductAlias, Store
+from ..pagination import decode_cursor, encode_cursor
+from ..models import CanonicalProduct, Price, ProductAlias, Store, utc_now
+from ..services.canonical_categories import (
+    CATEGORIES_CACHE_KEY,
+    categories_view_is_stale,
+    get_categories,
+    schedule_categories_refresh,
+)
+from ..services.canonical_insert_stats import top_inserted
+from ..services.current_prices import refresh_current_prices
 from ..services.product_normalizer import normalize_existing_products
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 limiter = Limiter(key_func=get_remote_address)
 
 
@@ -39,6 +52,18 @@ class CanonicalProductOut(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_validator("preco_data", mode="before")
+    @classmethod
+    def _preco_data_iso(cls, value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    @classmethod
+    def from_product(cls, product: CanonicalProduct, alias_count: int = 0) -> "CanonicalProductOut":
+        """Valida direto dos atributos do modelo (preço atual materializado incluso)."""
+        out = cls.model_validate(product)
+        out.alias_count = alias_count
+        return out
+
 
 class CanonicalProductCreate(BaseModel):
     """Schema para criar produto canônico."""
@@ -100,10 +125,12 @@ class ProductDetailOut(BaseModel):
 class CanonicalListResponse(BaseModel):
     """Resposta paginada de produtos canônicos."""
     items: List[CanonicalProductOut]
-    total: int
+    total: Optional[int] = None  # None quando with_total=false ou navegando por cursor
     page: int
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    has_more: bool = False
+    next_cursor: Optional[str] = None
 
 
 class CategoryCountOut(BaseModel):
@@ -126,9 +153,35 @@ class CanonicalKpisOut(BaseModel):
     top_inserted: List[TopInsertedOut]
 
 
+# === Helpers ===
+
+# Respostas que varrem a tabela inteira e mudam devagar; o TTL cobre inserções vindas da ingestão de cupons
+KPIS_CACHE_KEY = "canonical:kpis"
+CANONICAL_CACHE_TTL = 60
+
+
+def _invalidate_canonical_cache() -> None:
+    cache_delete(KPIS_CACHE_KEY)
+    # O cache de categorias é invalidado pelo refresh da view, depois que ela reflete a escrita
+    schedule_categories_refresh()
+
+
+def _latest_prices(db: DbSession, canonical_id: int) -> list[tuple[Price, Optional[Store]]]:
+    """Preço da data mais recente em cada loja, com a loja (DISTINCT ON; empate na data fica com o menor preço)."""
+    return (
+        db.query(Price, Store)
+        .outerjoin(Store, Store.id == Price.loja_id)
+        .filter(Price.canonical_id == canonical_id, Price.data_coleta.isnot(None))
+        .order_by(Price.loja_id, Price.data_coleta.desc(), Price.preco_por_unidade)
+        .distinct(Price.loja_id)
+        .all()
+    )
+
+
 # === Endpoints ===
 
-@router.get("/", response_model=CanonicalListResponse)
+# Listagem quente: serializa direto com orjson, sem revalidar via response_model.
+@router.get("/", response_model=None, responses={200: {"model": CanonicalListResponse}})
 @limiter.limit("60/minute")
 def list_canonical_products(
     request: Request,
@@ -137,91 +190,124 @@ def list_canonical_products(
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
     categoria: Optional[str] = None,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
 ):
-    """Lista produtos canônicos com paginação e filtros."""
+    """Lista produtos canônicos com paginação e filtros.
+
+    Para navegar use `cursor` com o `next_cursor` da página anterior; `page` > 1
+    (OFFSET) é mantido só por compatibilidade. O COUNT (total/pages) só roda na
+    paginação por página e pode ser dispensado com `with_total=false`; `has_more`
+    vem sempre.
+    """
     query = db.query(CanonicalProduct)
     
     if search:
+        # Com 3+ caracteres o ILIKE '%x%' usa os índices GIN de trigramas (pg_trgm);
+        # abaixo disso não há trigrama a buscar, então restringe a prefixo
+        pattern = f"%{search}%" if len(search) >= 3 else f"{search}%"
         query = query.filter(
-            CanonicalProduct.nome.ilike(f"%{search}%") |
-            CanonicalProduct.marca.ilike(f"%{search}%")
+            CanonicalProduct.nome.ilike(pattern) |
+            CanonicalProduct.marca.ilike(pattern)
         )
     
     if categoria:
         query = query.filter(CanonicalProduct.categoria == categoria)
     
-    total = query.count()
-    pages = (total + page_size - 1) // page_size
-    
-    items = query.order_by(CanonicalProduct.nome).offset((page - 1) * page_size).limit(page_size).all()
-    
-    # Conta aliases e busca preço mais recente para cada produto
-    result = []
-    for item in items:
-        alias_count = db.query(ProductAlias).filter(ProductAlias.canonical_id == item.id).count()
-        
-        # Busca o preço mais recente (menor preço entre as lojas com dados recentes)
-        # Subquery para pegar a data mais recente de cada loja
-        subquery = db.query(
-            Price.loja_id,
-            func.max(Price.data_coleta).label("max_date")
-        ).filter(
-            Price.canonical_id == item.id
-        ).group_by(Price.loja_id).subquery()
-        
-        # Busca os preços mais recentes de cada loja
-        recent_prices = db.query(Price).join(
-            subquery,
-            (Price.loja_id == subquery.c.loja_id) & 
-            (Price.data_coleta == subquery.c.max_date) &
-            (Price.canonical_id == item.id)
-        ).all()
-        
-        # Pega o menor preço entre os mais recentes
-        preco_atual = None
-        preco_data = None
-        if recent_prices:
-            menor_preco = min(recent_prices, key=lambda p: p.preco_por_unidade)
-            preco_atual = menor_preco.preco_por_unidade
-            preco_data = menor_preco.data_coleta.isoformat() if menor_preco.data_coleta else None
-        
-        result.append(CanonicalProductOut(
-            id=item.id,
-            nome=item.nome,
-            marca=item.marca,
-            categoria=item.categoria,
-            subcategoria=item.subcategoria,
-            unidade_padrao=item.unidade_padrao,
-            quantidade_padrao=item.quantidade_padrao,
-            gtin_principal=item.gtin_principal,
-            alias_count=alias_count,
-            preco_atual=preco_atual,
-            preco_data=preco_data
-        ))
+    # COUNT repete o filtro inteiro (ILIKE incluso): só quando o cliente mostra "página X de Y"
+    total = pages = None
+    if with_total and not cursor:
+        total = query.count()
+        pages = (total + page_size - 1) // page_size
+    
+    headers = {}
+    query = query.order_by(CanonicalProduct.nome, CanonicalProduct.id)
+    if cursor:
+        # Keyset: busca direto após a última linha da página anterior (índice em (nome, id))
+        cursor_nome, cursor_id = decode_cursor(cursor)
+        if not isinstance(cursor_nome, str) or not isinstance(cursor_id, int):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query = query.filter(tuple_(CanonicalProduct.nome, CanonicalProduct.id) > (cursor_nome, cursor_id))
+    elif page > 1:
+        # Paginação por OFFSET mantida por compatibilidade; prefira `cursor`
+        query = query.offset((page - 1) * page_size)
+        headers["Deprecation"] = "true"
+
+    # Uma linha a mais indica se existe próxima página sem precisar do COUNT
+    items = query.limit(page_size + 1).all()
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    
+    # Contagem de aliases da página inteira em uma consulta (preço atual já vem materializado no produto)
+    ids = [item.id for item in items]
+    alias_counts: dict[int, int] = {}
+    if ids:
+        alias_counts = dict(
+            db.query(ProductAlias.canonical_id, func.count(ProductAlias.id))
+            .filter(ProductAlias.canonical_id.in_(ids))
+            .group_by(ProductAlias.canonical_id)
+            .all()
+        )
+
+    result = [
+        {
+            "id": item.id,
+            "nome": item.nome,
+            "marca": item.marca,
+            "categoria": item.categoria,
+            "subcategoria": item.subcategoria,
+            "unidade_padrao": item.unidade_padrao,
+            "quantidade_padrao": item.quantidade_padrao,
+            "gtin_principal": item.gtin_principal,
+            "alias_count": alias_counts.get(item.id, 0),
+            "preco_atual": item.preco_atual,
+            "preco_data": item.preco_data.isoformat() if item.preco_data else None,
+        }
+        for item in items
+    ]
     
-    return CanonicalListResponse(
-        items=result,
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=pages
-    )
+    return ORJSONResponse({
+        "items": result,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": pages,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(items[-1].nome, items[-1].id) if has_more else None,
+    }, headers=headers)
 
 
 @router.get("/categories")
 @limiter.limit("60/minute")
 def list_categories(request: Request, db: DbSession):
     """Lista todas as categorias disponíveis."""
-    categories = db.query(CanonicalProduct.categoria).filter(
-        CanonicalProduct.categoria.isnot(None)
-    ).distinct().all()
-    return [c[0] for c in categories if c[0]]
+    cached = cache_get_json(CATEGORIES_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    if categories_view_is_stale():
+        # Cobre categorias criadas fora deste router (ingestão de cupons)
+        schedule_categories_refresh()
+
+    result = get_categories(db)
+    cache_set_json(CATEGORIES_CACHE_KEY, result, CANONICAL_CACHE_TTL)
+    return result
 
 
-@router.get("/kpis", response_model=CanonicalKpisOut)
+@router.get("/kpis", response_model=None, responses={200: {"model": CanonicalKpisOut}})
 @limiter.limit("60/minute")
 def canonical_kpis(request: Request, db: DbSession):
-    total_products = db.query(func.count(CanonicalProduct.id)).scalar() or 0
+    cached = cache_get_json(KPIS_CACHE_KEY)
+    if cached is not None:
+        return ORJSONResponse(cached)
+
+    # Total e novos em 7/30 dias numa única varredura (agregados com FILTER)
+    now = datetime.now(UTC)
+    total_products, new_last_7d, new_last_30d = db.query(
+        func.count(CanonicalProduct.id),
+        func.count(CanonicalProduct.id).filter(CanonicalProduct.created_at >= (now - timedelta(days=7))),
+        func.count(CanonicalProduct.id).filter(CanonicalProduct.created_at >= (now - timedelta(days=30))),
+    ).one()
 
     categories_rows = (
         db.query(CanonicalProduct.categoria, func.count(CanonicalProduct.id))
@@ -230,53 +316,20 @@ def canonical_kpis(request: Request, db: DbSession):
         .order_by(func.count(CanonicalProduct.id).desc())
         .all()
     )
-    categories = [CategoryCountOut(categoria=c or "(Sem categoria)", total=int(t)) for c, t in categories_rows]
-
-    now = datetime.utcnow()
-    new_last_7d = (
-        db.query(func.count(CanonicalProduct.id))
-        .filter(CanonicalProduct.created_at >= (now - timedelta(days=7)))
-        .scalar()
-        or 0
-    )
-    new_last_30d = (
-        db.query(func.count(CanonicalProduct.id))
-        .filter(CanonicalProduct.created_at >= (now - timedelta(days=30)))
-        .scalar()
-        or 0
-    )
+    categories = [{"categoria": c or "(Sem categoria)", "total": int(t)} for c, t in categories_rows]
 
-    top_rows = (
-        db.query(
-            Price.canonical_id,
-            func.count(func.distinct(Price.cupom_id)).label("inserts"),
-            CanonicalProduct.nome,
-            CanonicalProduct.categoria,
-        )
-        .join(CanonicalProduct, CanonicalProduct.id == Price.canonical_id)
-        .filter(Price.cupom_id.isnot(None))
-        .group_by(Price.canonical_id, CanonicalProduct.nome, CanonicalProduct.categoria)
-        .order_by(func.count(func.distinct(Price.cupom_id)).desc())
-        .limit(10)
-        .all()
-    )
-    top_inserted = [
-        TopInsertedOut(
-            canonical_id=int(cid),
-            nome=nome,
-            categoria=categoria,
-            inserts=int(ins),
-        )
-        for cid, ins, nome, categoria in top_rows
-    ]
+    # Lido do rollup canonical_insert_stats (recalculado em background)
+    top = top_inserted(db)
 
-    return CanonicalKpisOut(
-        total_products=int(total_products),
-        categories=categories,
-        new_last_7d=int(new_last_7d),
-        new_last_30d=int(new_last_30d),
-        top_inserted=top_inserted,
-    )
+    kpis = {
+        "total_products": int(total_products),
+        "categories": categories,
+        "new_last_7d": int(new_last_7d),
+        "new_last_30d": int(new_last_30d),
+        "top_inserted": top,
+    }
+    cache_set_json(KPIS_CACHE_KEY, kpis, CANONICAL_CACHE_TTL)
+    return ORJSONResponse(kpis)
 
 
 @router.get("/duplicates")
@@ -296,6 +349,7 @@ def merge_duplicates(request: Request, db: DbSession):
     from ..services.product_agent import auto_merge_duplicates
     
     result = auto_merge_duplicates(db)
+    _invalidate_canonical_cache()
     return result
 
 
@@ -309,17 +363,7 @@ def get_canonical_product(request: Request, canonical_id: int, db: DbSession):
     
     alias_count = db.query(ProductAlias).filter(ProductAlias.canonical_id == canonical_id).count()
     
-    return CanonicalProductOut(
-        id=product.id,
-        nome=product.nome,
-        marca=product.marca,
-        categoria=product.categoria,
-        subcategoria=product.subcategoria,
-        unidade_padrao=product.unidade_padrao,
-        quantidade_padrao=product.quantidade_padrao,
-        gtin_principal=product.gtin_principal,
-        alias_count=alias_count
-    )
+    return CanonicalProductOut.from_product(product, alias_count)
 
 
 @router.get("/{canonical_id}/details", response_model=ProductDetailOut)
@@ -330,11 +374,15 @@ def get_canonical_product_details(request: Request, canonical_id: int, db: DbSes
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
-    # Busca aliases
-    aliases = db.query(ProductAlias).filter(ProductAlias.canonical_id == canonical_id).all()
+    # Busca aliases (com a loja no mesmo SELECT)
+    aliases = (
+        db.query(ProductAlias, Store)
+        .outerjoin(Store, Store.id == ProductAlias.loja_id)
+        .filter(ProductAlias.canonical_id == canonical_id)
+        .all()
+    )
     aliases_out = []
-    for alias in aliases:
-        loja = db.get(Store, alias.loja_id) if alias.loja_id else None
+    for alias, loja in aliases:
         aliases_out.append(AliasOut(
             id=alias.id,
             descricao_original=alias.descricao_original,
@@ -344,23 +392,10 @@ def get_canonical_product_details(request: Request, canonical_id: int, db: DbSes
         ))
     
     # Busca preços mais recentes de cada loja
-    subquery = db.query(
-        Price.loja_id,
-        func.max(Price.data_coleta).label("max_date")
-    ).filter(
-        Price.canonical_id == canonical_id
-    ).group_by(Price.loja_id).subquery()
-    
-    prices = db.query(Price).join(
-        subquery,
-        (Price.loja_id == subquery.c.loja_id) & 
-        (Price.data_coleta == subquery.c.max_date) &
-        (Price.canonical_id == canonical_id)
-    ).all()
+    prices = _latest_prices(db, canonical_id)
     
     precos_out = []
-    for price in prices:
-        loja = db.get(Store, price.loja_id)
+    for price, loja in prices:
         precos_out.append(PriceComparisonOut(
             loja_id=price.loja_id,
             loja_nome=loja.nome if loja else "Desconhecida",
@@ -391,15 +426,15 @@ def get_canonical_product_details(request: Request, canonical_id: int, db: DbSes
 @limiter.limit("60/minute")
 def get_product_aliases(request: Request, canonical_id: int, db: DbSession):
     """Lista aliases de um produto canônico."""
-    aliases = db.query(ProductAlias).filter(ProductAlias.canonical_id == canonical_id).all()
+    aliases = (
+        db.query(ProductAlias, Store.nome)
+        .outerjoin(Store, Store.id == ProductAlias.loja_id)
+        .filter(ProductAlias.canonical_id == canonical_id)
+        .all()
+    )
     
     result = []
-    for alias in aliases:
-        loja_nome = None
-        if alias.loja_id:
-            loja = db.get(Store, alias.loja_id)
-            loja_nome = loja.nome if loja else None
-        
+    for alias, loja_nome in aliases:
         result.append(AliasOut(
             id=alias.id,
             descricao_original=alias.descricao_original,
@@ -416,23 +451,10 @@ def get_product_aliases(request: Request, canonical_id: int, db: DbSession):
 def get_product_prices(request: Request, canonical_id: int, db: DbSession):
     """Obtém preços de um produto canônico em diferentes lojas."""
     # Busca o preço mais recente de cada loja
-    subquery = db.query(
-        Price.loja_id,
-        func.max(Price.data_coleta).label("max_date")
-    ).filter(
-        Price.canonical_id == canonical_id
-    ).group_by(Price.loja_id).subquery()
-    
-    prices = db.query(Price).join(
-        subquery,
-        (Price.loja_id == subquery.c.loja_id) & 
-        (Price.data_coleta == subquery.c.max_date) &
-        (Price.canonical_id == canonical_id)
-    ).all()
+    prices = _latest_prices(db, canonical_id)
     
     result = []
-    for price in prices:
-        loja = db.get(Store, price.loja_id)
+    for price, loja in prices:
         result.append(PriceComparisonOut(
             loja_id=price.loja_id,
             loja_nome=loja.nome if loja else "Desconhecida",
@@ -462,18 +484,9 @@ def create_canonical_product(request: Request, payload: CanonicalProductCreate,
     db.add(product)
     db.commit()
     db.refresh(product)
+    _invalidate_canonical_cache()
     
-    return CanonicalProductOut(
-        id=product.id,
-        nome=product.nome,
-        marca=product.marca,
-        categoria=product.categoria,
-        subcategoria=product.subcategoria,
-        unidade_padrao=product.unidade_padrao,
-        quantidade_padrao=product.quantidade_padrao,
-        gtin_principal=product.gtin_principal,
-        alias_count=0
-    )
+    return CanonicalProductOut.from_product(product)
 
 
 @router.put("/{canonical_id}", response_model=CanonicalProductOut)
@@ -504,20 +517,11 @@ def update_canonical_product(
     
     db.commit()
     db.refresh(product)
+    _invalidate_canonical_cache()
     
     alias_count = db.query(ProductAlias).filter(ProductAlias.canonical_id == canonical_id).count()
     
-    return CanonicalProductOut(
-        id=product.id,
-        nome=product.nome,
-        marca=product.marca,
-        categoria=product.categoria,
-        subcategoria=product.subcategoria,
-        unidade_padrao=product.unidade_padrao,
-        quantidade_padrao=product.quantidade_padrao,
-        gtin_principal=product.gtin_principal,
-        alias_count=alias_count
-    )
+    return CanonicalProductOut.from_product(product, alias_count)
 
 
 @router.post("/{canonical_id}/merge/{other_id}")
@@ -532,25 +536,34 @@ def merge_canonical_products(
     if canonical_id == other_id:
         raise HTTPException(status_code=400, detail="Não é possível mesclar um produto consigo mesmo")
     
-    canonical = db.get(CanonicalProduct, canonical_id)
-    other = db.get(CanonicalProduct, other_id)
-    
-    if not canonical or not other:
+    # Existência dos dois num só SELECT, sem carregar os objetos na sessão
+    found = db.execute(
+        select(func.count()).select_from(CanonicalProduct).where(CanonicalProduct.id.in_([canonical_id, other_id]))
+    ).scalar_one()
+    if found != 2:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
-    # Move aliases
-    aliases_moved = db.query(ProductAlias).filter(
-        ProductAlias.canonical_id == other_id
-    ).update({"canonical_id": canonical_id})
-    
-    # Move preços
-    prices_moved = db.query(Price).filter(
-        Price.canonical_id == other_id
-    ).update({"canonical_id": canonical_id})
-    
-    # Remove o produto duplicado
-    db.delete(other)
+    # Move aliases e preços e remove o duplicado direto no banco (nada disso está no identity map)
+    aliases_moved = db.execute(
+        update(ProductAlias)
+        .where(ProductAlias.canonical_id == other_id)
+        .values(canonical_id=canonical_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    prices_moved = db.execute(
+        update(Price)
+        .where(Price.canonical_id == other_id)
+        .values(canonical_id=canonical_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.execute(
+        delete(CanonicalProduct)
+        .where(CanonicalProduct.id == other_id)
+        .execution_options(synchronize_session=False)
+    )
+    refresh_current_prices(db, [canonical_id])
     db.commit()
+    _invalidate_canonical_cache()
     
     logger.info(f"Mesclado produto {other_id} em {canonical_id}: {aliases_moved} aliases, {prices_moved} preços")
     
@@ -566,6 +579,7 @@ def merge_canonical_products(
 def normalize_products_batch(request: Request, db: DbSession, batch_size: int = 50):
     """Normaliza um lote de produtos existentes."""
     stats = normalize_existing_products(db, batch_size)
+    _invalidate_canonical_cache()
     return stats
 
 
@@ -577,6 +591,7 @@ def renormalize_product(request: Request, canonical_id: int, db: DbSession):
     
     try:
         result = renormalize_canonical_product(db, canonical_id)
+        _invalidate_canonical_cache()
         
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
@@ -596,60 +611,86 @@ def renormalize_batch(request: Request, db: DbSession, batch_size: int = Query(2
     """Renormaliza um lote de produtos canônicos existentes usando o agente especializado."""
     from ..services.product_agent import ProductNormalizationAgent
     
+    # Descrição original do primeiro alias (contexto do agente) na mesma consulta dos produtos
+    first_alias = (
+        select(ProductAlias.descricao_original)
+        .where(ProductAlias.canonical_id == CanonicalProduct.id)
+        .order_by(ProductAlias.id)
+        .limit(1)
+        .correlate(CanonicalProduct)
+        .scalar_subquery()
+    )
+    
     # Busca produtos que parecem mal normalizados (nomes curtos ou genéricos)
-    products = db.query(CanonicalProduct).filter(
+    rows = db.query(CanonicalProduct, first_alias).filter(
         func.length(CanonicalProduct.nome) < 20
-    ).limit(batch_size).all()
+    ).order_by(CanonicalProduct.id).limit(batch_size).all()
     
-    if not products:
+    if not rows:
         # Se não tem nomes curtos, pega os mais antigos
-        products = db.query(CanonicalProduct).order_by(
+        rows = db.query(CanonicalProduct, first_alias).order_by(
             CanonicalProduct.id
         ).limit(batch_size).all()
     
     agent = ProductNormalizationAgent(db, use_ai=True)
     stats = {"processed": 0, "updated": 0, "errors": 0, "details": []}
     
-    for product in products:
+    def _normalize(descricao: Optional[str]):
+        # Roda nas threads do pool: o agente não usa a sessão em normalize(), só a API da OpenAI
+        if not descricao:
+            return None, None
         try:
-            # Busca alias para contexto
-            alias = db.query(ProductAlias).filter(
-                ProductAlias.canonical_id == product.id
-            ).first()
-            
-            if not alias:
-                stats["processed"] += 1
-                continue
-            
-            # Usa o agente para normalizar
-            info = agent.normalize(alias.descricao_original)
-            
-            if info and info.get('nome'):
-                old_nome = product.nome
-                new_nome = info.get('nome')
-                
-                # Só atualiza se o novo nome for diferente E mais descritivo (ou igual tamanho)
-                # Evita simplificar demais (ex: "Biscoito de Leite" -> "Biscoito")
-                if new_nome.lower() != old_nome.lower() and len(new_nome) >= len(old_nome) * 0.8:
-                    product.nome = new_nome
-                    product.marca = info.get('marca') or product.marca
-                    product.categoria = info.get('categoria') or product.categoria
-                    product.subcategoria = info.get('subcategoria') or product.subcategoria
-                    product.unidade_padrao = info.get('unidade') or product.unidade_padrao
-                    product.quantidade_padrao = info.get('quantidade') or product.quantidade_padrao
-                    
-                    stats["updated"] += 1
-                    stats["details"].append({
-                        "id": product.id,
-                        "old": old_nome,
-                        "new": new_nome
-                    })
-            
-            stats["processed"] += 1
-            
+            return agent.normalize(descricao), None
         except Exception as e:
-            logger.error(f"Erro ao renormalizar {product.id}: {e}")
+            return None, e
+    
+    # Chamadas ao LLM são I/O: em paralelo o lote leva ~N/workers latências em vez de N.
+    # Só descrições que vão de fato ao agente ocupam thread.
+    descricoes = [descricao for _, descricao in rows]
+    workers = min(settings.openai_max_concurrency, sum(1 for d in descricoes if d))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_normalize, descricoes))
+    else:
+        results = [_normalize(d) for d in descricoes]
+    
+    updates = []
+    for (product, descricao_original), (info, error) in zip(rows, results):
+        if error is not None:
+            logger.error(f"Erro ao renormalizar {product.id}: {error}")
             stats["errors"] += 1
+            continue
+        
+        if info and info.get('nome'):
+            old_nome = product.nome
+            new_nome = info.get('nome')
+            
+            # Só atualiza se o novo nome for diferente E mais descritivo (ou igual tamanho)
+            # Evita simplificar demais (ex: "Biscoito de Leite" -> "Biscoito"); 5*novo >= 4*antigo == novo >= 80%
+            if new_nome.lower() != old_nome.lower() and len(new_nome) * 5 >= len(old_nome) * 4:
+                updates.append({
+                    "id": product.id,
+                    "nome": new_nome,
+                    "marca": info.get('marca') or product.marca,
+                    "categoria": info.get('categoria') or product.categoria,
+                    "subcategoria": info.get('subcategoria') or product.subcategoria,
+                    "unidade_padrao": info.get('unidade') or product.unidade_padrao,
+                    "quantidade_padrao": info.get('quantidade') or product.quantidade_padrao,
+                    "updated_at": utc_now(),
+                })
+                
+                stats["updated"] += 1
+                stats["details"].append({
+                    "id": product.id,
+                    "old": old_nome,
+                    "new": new_nome
+                })
+        
+        stats["processed"] += 1
     
+    if updates:
+        # UPDATE em lote por chave primária (executemany) em vez de um por produto no flush
+        db.execute(update(CanonicalProduct), updates)
     db.commit()
+    _invalidate_canonical_cache()
     return stats
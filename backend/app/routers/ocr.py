@@ -1,17 +1,22 @@
 """Router para OCR de cupons fiscais usando GPT-4 Vision."""
 
 import base64
+import io
 import json
 import logging
 from typing import Any
 
+import httpx
 from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+_openai_client = None  # AsyncOpenAI, criado sob demanda (openai é importado só quando usado)
+
 
 RECEIPT_PROMPT = """Analise esta imagem de um cupom fiscal brasileiro (NFC-e) e extraia as informações em formato JSON.
 
@@ -50,6 +55,60 @@ Regras:
 - Mantenha os nomes dos produtos em MAIÚSCULAS como aparecem no cupom"""
 
 
+# Lado maior enviado ao modelo: acima disso o Vision reduz a imagem de qualquer forma
+OCR_MAX_SIDE = 2048
+OCR_JPEG_QUALITY = 85
+
+
+def _shrink_image(image_data: bytes, mime_type: str) -> tuple[bytes, str]:
+    """Reduz a imagem para no máximo OCR_MAX_SIDE e recomprime em JPEG.
+
+    Foto de celular de cupom costuma ter 3-5x mais bytes (e tiles cobrados) do que o
+    necessário para o OCR. Sem Pillow, ou se não ficar menor, devolve o original.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except Exception:
+        return image_data, mime_type
+
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning(f"Não foi possível reduzir a imagem do OCR: {e}")
+        return image_data, mime_type
+
+    if buf.tell() >= len(image_data):
+        return image_data, mime_type
+    return buf.getvalue(), "image/jpeg"
+
+
+def _get_openai_client():
+    """Cliente OpenAI compartilhado entre requisições (reaproveita conexões TLS com a API)."""
+    global _openai_client
+    if _openai_client is None or _openai_client.is_closed():
+        from openai import AsyncOpenAI
+
+        _openai_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            max_retries=2,
+        )
+    return _openai_client
+
+
+async def close_openai_client() -> None:
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+
 @router.post("/extract")
 async def extract_receipt_data(file: UploadFile = File(...)) -> dict[str, Any]:
     """
@@ -72,24 +131,22 @@ async def extract_receipt_data(file: UploadFile = File(...)) -> dict[str, Any]:
     
     try:
         try:
-            from openai import OpenAI
-        except Exception:
+            client = _get_openai_client()
+        except ImportError:
             raise HTTPException(
                 status_code=503,
                 detail="Dependência 'openai' não está instalada no servidor",
             )
 
-        # Lê e codifica a imagem
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
-        
-        # Determina o tipo MIME
-        mime_type = file.content_type or "image/jpeg"
-        
-        # Chama GPT-4 Vision
-        client = OpenAI(api_key=settings.openai_api_key)
+        # Lê, reduz (fora do event loop) e monta a data URL com uma única cópia em str
+        image_data, mime_type = await run_in_threadpool(
+            _shrink_image, await file.read(), file.content_type or "image/jpeg"
+        )
+        image_url = (f"data:{mime_type};base64,".encode("ascii") + base64.b64encode(image_data)).decode("ascii")
+        del image_data
         
-        response = client.chat.completions.create(
+        # Chama GPT-4 Vision (assíncrono: não prende uma thread durante os segundos da chamada)
+        response = await client.chat.completions.create(
             model="gpt-4o",  # ou gpt-4-vision-preview
             messages=[
                 {
@@ -99,7 +156,7 @@ async def extract_receipt_data(file: UploadFile = File(...)) -> dict[str, Any]:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}",
+                                "url": image_url,
                                 "detail": "high"  # Alta resolução para melhor OCR
                             }
                         }
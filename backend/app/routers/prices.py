@@ -1,22 +1,29 @@
 """Router para operações com preços."""
 
 import logging
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
 from math import ceil
 
-from fastapi import APIRouter, HTTPException, Query, Request
+import orjson
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import and_, func
+from sqlalchemy import func, insert, lambda_stmt, select, tuple_
 
-from ..database import DbSession
+from ..cache import cache_delete, cache_get_json, cache_set_json
+from ..database import DbSession, SessionLocal
+from ..etag import json_response_with_etag
+from ..pagination import decode_datetime_cursor, encode_cursor
 from ..models import Price, Product, Store
 from ..schemas import PriceCreate, PriceOut
+from ..services.current_prices import refresh_current_prices
+from ..services.lookup_cache import get_product_meta, get_store_meta
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 limiter = Limiter(key_func=get_remote_address)
 
 
@@ -26,10 +33,12 @@ limiter = Limiter(key_func=get_remote_address)
 class PriceListResponse(BaseModel):
     """Response para listagem de preços."""
     items: list[PriceOut]
-    total: int
+    total: int | None = None  # None quando with_total=false ou navegando por cursor
     page: int
     page_size: int
-    pages: int
+    pages: int | None = None
+    has_more: bool = False
+    next_cursor: str | None = None
 
 
 class PriceCompareItem(BaseModel):
@@ -68,6 +77,44 @@ class PriceHistoryResponse(BaseModel):
     historico: list[PriceHistoryItem]
 
 
+# === Helpers ===
+
+# Comparação/histórico: leitura pública que já tolera até 60s de atraso (cache Redis);
+# clientes e proxies podem reaproveitar e revalidar com If-None-Match
+PRICE_READ_CACHE_HEADERS = {"Cache-Control": "public, max-age=60, stale-while-revalidate=300"}
+
+# Campos de PriceOut, na ordem do schema (listagem monta o dict direto da linha)
+PRICE_OUT_COLUMNS = (
+    Price.produto_id,
+    Price.loja_id,
+    Price.preco_por_unidade,
+    Price.unidade_base,
+    Price.fonte,
+    Price.id,
+    Price.data_coleta,
+    Price.cupom_id,
+    Price.created_at,
+)
+
+# Comparação por produto: leitura frequente, muda só quando entra/sai preço do produto
+PRICE_COMPARE_CACHE_TTL = 60
+PRICE_COMPARE_MAX_DIAS = 90
+
+PRICE_BULK_MAX_ITEMS = 500
+
+# Linhas lidas do cursor do servidor por vez na exportação NDJSON
+PRICE_EXPORT_BATCH = 500
+
+
+def _price_compare_cache_key(produto_id: int, dias: int) -> str:
+    return f"price_compare:{produto_id}:{dias}"
+
+
+def _invalidate_price_compare(produto_id: int) -> None:
+    # Uma chave por janela de dias: um único DEL remove todas
+    cache_delete(*(_price_compare_cache_key(produto_id, d) for d in range(1, PRICE_COMPARE_MAX_DIAS + 1)))
+
+
 # === Endpoints ===
 
 
@@ -84,33 +131,93 @@ def create_price(request: Request, payload: PriceCreate, db: DbSession):
     - **fonte**: Fonte do preço (cupom, manual, api)
     - **cupom_id**: Chave do cupom de origem (opcional)
     """
-    # Verifica se produto existe
-    product = db.get(Product, payload.produto_id)
-    if not product:
+    # Escrita valida no banco (só colunas), não no cache por processo: um produto/loja
+    # removido por outro worker ainda estaria no cache e o INSERT violaria a FK
+    unidade_base = (
+        db.query(Product.unidade_base).filter(Product.id == payload.produto_id).scalar()
+    )
+    if unidade_base is None:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
     # Verifica se loja existe
-    store = db.get(Store, payload.loja_id)
-    if not store:
+    if db.query(Store.id).filter(Store.id == payload.loja_id).scalar() is None:
         raise HTTPException(status_code=404, detail="Loja não encontrada")
 
     price = Price(
         produto_id=payload.produto_id,
         loja_id=payload.loja_id,
         preco_por_unidade=payload.preco_por_unidade,
-        unidade_base=payload.unidade_base or product.unidade_base,
+        unidade_base=payload.unidade_base or unidade_base,
         fonte=payload.fonte,
         cupom_id=payload.cupom_id,
     )
     db.add(price)
     db.commit()
     db.refresh(price)
+    _invalidate_price_compare(payload.produto_id)
 
     logger.info(f"Preço registrado: produto={payload.produto_id}, loja={payload.loja_id}, valor={payload.preco_por_unidade}")
     return price
 
 
-@router.get("/", response_model=PriceListResponse)
+@router.post("/bulk", response_model=list[PriceOut], status_code=201)
+@limiter.limit("30/minute")
+def create_prices_bulk(
+    request: Request,
+    db: DbSession,
+    payload: list[PriceCreate] = Body(..., min_length=1, max_length=PRICE_BULK_MAX_ITEMS),
+):
+    """
+    Registra vários preços de uma vez (ex.: ingestão de cupom).
+
+    Mesmos campos do POST /, em lista (até 500 itens). Tudo ou nada: se algum
+    produto ou loja não existir nada é gravado. Um INSERT ... RETURNING e um
+    único commit para o lote inteiro.
+    """
+    produto_ids = {p.produto_id for p in payload}
+    loja_ids = {p.loja_id for p in payload}
+
+    # Valida todos os IDs com uma consulta por tabela
+    unidades = dict(
+        db.query(Product.id, Product.unidade_base).filter(Product.id.in_(produto_ids)).all()
+    )
+    missing = sorted(produto_ids - unidades.keys())
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Produto(s) não encontrado(s): {', '.join(map(str, missing))}",
+        )
+    found_lojas = {row.id for row in db.query(Store.id).filter(Store.id.in_(loja_ids))}
+    missing = sorted(loja_ids - found_lojas)
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Loja(s) não encontrada(s): {', '.join(map(str, missing))}",
+        )
+
+    rows = [
+        {
+            "produto_id": p.produto_id,
+            "loja_id": p.loja_id,
+            "preco_por_unidade": p.preco_por_unidade,
+            "unidade_base": p.unidade_base or unidades[p.produto_id],
+            "fonte": p.fonte,
+            "cupom_id": p.cupom_id,
+        }
+        for p in payload
+    ]
+    prices = db.scalars(insert(Price).returning(Price, sort_by_parameter_order=True), rows).all()
+    db.commit()
+    for produto_id in produto_ids:
+        _invalidate_price_compare(produto_id)
+
+    logger.info(f"Preços registrados em lote: {len(prices)} preço(s), {len(produto_ids)} produto(s)")
+    return prices
+
+
+# Listagem quente: colunas de PriceOut direto em dicts serializados com orjson,
+# sem materializar objetos ORM nem revalidar via response_model.
+@router.get("/", response_model=None, responses={200: {"model": PriceListResponse}})
 @limiter.limit("60/minute")
 def list_prices(
     request: Request,
@@ -122,17 +229,24 @@ def list_prices(
     fonte: str | None = Query(None, description="Filtrar por fonte"),
     data_inicio: datetime | None = Query(None, description="Data inicial"),
     data_fim: datetime | None = Query(None, description="Data final"),
+    cursor: str | None = Query(None, description="Cursor da próxima página (next_cursor)"),
+    with_total: bool = Query(True, description="Calcular total/pages (COUNT)"),
 ):
     """
     Lista preços com paginação e filtros.
 
+    Para navegar use `cursor` com o `next_cursor` da resposta anterior;
+    `page` > 1 (OFFSET) é mantido só por compatibilidade. O COUNT (total/pages)
+    só roda na paginação por página e pode ser dispensado com `with_total=false`;
+    `has_more` vem sempre.
+
     - **produto_id**: Filtrar por produto
     - **loja_id**: Filtrar por loja
     - **fonte**: Filtrar por fonte (cupom, manual, api)
     - **data_inicio**: Data inicial do período
     - **data_fim**: Data final do período
     """
-    query = db.query(Price)
+    query = db.query(*PRICE_OUT_COLUMNS)
 
     # Filtros
     if produto_id:
@@ -146,34 +260,53 @@ def list_prices(
     if data_fim:
         query = query.filter(Price.data_coleta <= data_fim)
 
-    # Contagem total
-    total = query.count()
+    # COUNT repete o filtro inteiro: só quando o cliente mostra "página X de Y"
+    total = pages = None
+    if with_total and not cursor:
+        total = query.count()
+        pages = ceil(total / page_size) if total > 0 else 0
 
     # Paginação
-    offset = (page - 1) * page_size
-    prices = (
-        query.order_by(Price.data_coleta.desc())
-        .offset(offset)
-        .limit(page_size)
-        .all()
-    )
-
-    return PriceListResponse(
-        items=prices,
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=ceil(total / page_size) if total > 0 else 0,
-    )
-
-
-@router.get("/compare/{produto_id}", response_model=PriceCompareResponse)
+    headers = {}
+    query = query.order_by(Price.data_coleta.desc(), Price.id.desc())
+    if cursor:
+        # Keyset: busca direto após a última linha da página anterior
+        cursor_ts, cursor_id = decode_datetime_cursor(cursor)
+        query = query.filter(tuple_(Price.data_coleta, Price.id) < (cursor_ts, cursor_id))
+    elif page > 1:
+        # Paginação por OFFSET mantida por compatibilidade; prefira `cursor`
+        query = query.offset((page - 1) * page_size)
+        headers["Deprecation"] = "true"
+
+    # Uma linha a mais indica se existe próxima página sem precisar do COUNT
+    prices = query.limit(page_size + 1).all()
+    has_more = len(prices) > page_size
+    prices = prices[:page_size]
+
+    next_cursor = None
+    if has_more and prices[-1].data_coleta is not None:
+        next_cursor = encode_cursor(prices[-1].data_coleta, prices[-1].id)
+
+    # Listagem do painel: sempre revalida (If-None-Match -> 304 sem corpo)
+    headers["Cache-Control"] = "no-cache"
+    return json_response_with_etag(request, {
+        "items": [row._asdict() for row in prices],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": pages,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }, headers=headers)
+
+
+@router.get("/compare/{produto_id}", response_model=None, responses={200: {"model": PriceCompareResponse}})
 @limiter.limit("60/minute")
 def compare_prices(
     request: Request,
     produto_id: int,
     db: DbSession,
-    dias: int = Query(7, ge=1, le=90, description="Considerar preços dos últimos N dias"),
+    dias: int = Query(7, ge=1, le=PRICE_COMPARE_MAX_DIAS, description="Considerar preços dos últimos N dias"),
 ):
     """
     Compara preços de um produto em diferentes lojas.
@@ -183,76 +316,92 @@ def compare_prices(
     
     Retorna o menor preço, maior preço, média e lista de preços por loja.
     """
-    product = db.get(Product, produto_id)
+    cache_key = _price_compare_cache_key(produto_id, dias)
+    cached = cache_get_json(cache_key)
+    if cached is not None:
+        return json_response_with_etag(request, cached, headers=PRICE_READ_CACHE_HEADERS)
+
+    product = get_product_meta(db, produto_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
     # Data limite
-    data_limite = datetime.utcnow() - timedelta(days=dias)
-
-    # Busca o preço mais recente de cada loja
-    # Subquery para pegar o preço mais recente por loja
-    subquery = (
-        db.query(
-            Price.loja_id,
-            func.max(Price.data_coleta).label("max_data")
-        )
-        .filter(Price.produto_id == produto_id)
-        .filter(Price.data_coleta >= data_limite)
-        .group_by(Price.loja_id)
+    data_limite = datetime.now(UTC) - timedelta(days=dias)
+
+    # Preço mais recente de cada loja: DISTINCT ON (loja_id) lê o índice
+    # (produto_id, loja_id, data_coleta DESC) em vez de agregar e juntar de volta.
+    # Empate na data dentro da loja fica com o menor preço.
+    latest = (
+        select(Price.id)
+        .where(Price.produto_id == produto_id, Price.data_coleta >= data_limite)
+        .order_by(Price.loja_id, Price.data_coleta.desc(), Price.preco_por_unidade)
+        .distinct(Price.loja_id)
         .subquery()
     )
 
-    # Query principal
-    prices = (
-        db.query(Price)
-        .join(
-            subquery,
-            and_(
-                Price.loja_id == subquery.c.loja_id,
-                Price.data_coleta == subquery.c.max_data,
-                Price.produto_id == produto_id,
-            )
+    # Query principal, já ordenada por preço e com as estatísticas calculadas
+    # no banco (agregados como janela sobre o resultado, mesma ida ao banco).
+    # Só as colunas usadas na resposta, com a loja no mesmo SELECT.
+    valor = Price.preco_por_unidade
+    rows = (
+        db.query(
+            Price.loja_id,
+            Store.nome,
+            Store.cidade,
+            valor,
+            Price.data_coleta,
+            func.min(valor).over(),
+            func.max(valor).over(),
+            func.avg(valor).over(),
         )
+        .join(latest, latest.c.id == Price.id)
+        .outerjoin(Store, Store.id == Price.loja_id)
+        .order_by(valor, Price.loja_id)
         .all()
     )
 
-    if not prices:
-        return PriceCompareResponse(
+    if not rows:
+        result = PriceCompareResponse(
             produto_id=produto_id,
-            produto_descricao=product.descricao_norm,
+            produto_descricao=product["descricao_norm"],
             menor_preco=None,
             maior_preco=None,
             preco_medio=None,
             total_lojas=0,
             precos=[],
         )
+        content = result.model_dump(mode="json")
+        cache_set_json(cache_key, content, PRICE_COMPARE_CACHE_TTL)
+        return json_response_with_etag(request, content, headers=PRICE_READ_CACHE_HEADERS)
+
+    menor_preco, maior_preco, preco_medio = rows[0][5:]
+
+    precos_list = [
+        PriceCompareItem(
+            loja_id=loja_id,
+            loja_nome=loja_nome,
+            loja_cidade=loja_cidade,
+            preco=preco,
+            data_coleta=data_coleta,
+        )
+        for loja_id, loja_nome, loja_cidade, preco, data_coleta, *_ in rows
+    ]
 
-    # Calcula estatísticas
-    valores = [p.preco_por_unidade for p in prices]
-    
-    precos_list = []
-    for p in sorted(prices, key=lambda x: x.preco_por_unidade):
-        precos_list.append(PriceCompareItem(
-            loja_id=p.loja_id,
-            loja_nome=p.loja.nome if p.loja else None,
-            loja_cidade=p.loja.cidade if p.loja else None,
-            preco=p.preco_por_unidade,
-            data_coleta=p.data_coleta,
-        ))
-
-    return PriceCompareResponse(
+    result = PriceCompareResponse(
         produto_id=produto_id,
-        produto_descricao=product.descricao_norm,
-        menor_preco=min(valores),
-        maior_preco=max(valores),
-        preco_medio=sum(valores) / len(valores),
-        total_lojas=len(prices),
+        produto_descricao=product["descricao_norm"],
+        menor_preco=menor_preco,
+        maior_preco=maior_preco,
+        preco_medio=float(preco_medio),
+        total_lojas=len(rows),
         precos=precos_list,
     )
+    content = result.model_dump(mode="json")
+    cache_set_json(cache_key, content, PRICE_COMPARE_CACHE_TTL)
+    return json_response_with_etag(request, content, headers=PRICE_READ_CACHE_HEADERS)
 
 
-@router.get("/history/{produto_id}", response_model=PriceHistoryResponse)
+@router.get("/history/{produto_id}", response_model=None, responses={200: {"model": PriceHistoryResponse}})
 @limiter.limit("60/minute")
 def price_history(
     request: Request,
@@ -270,48 +419,90 @@ def price_history(
     - **dias**: Histórico dos últimos N dias (default: 30)
     - **limit**: Máximo de registros (default: 100)
     """
-    product = db.get(Product, produto_id)
+    product = get_product_meta(db, produto_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
     # Data limite
-    data_limite = datetime.utcnow() - timedelta(days=dias)
-
-    # Query
-    query = (
-        db.query(Price)
-        .filter(Price.produto_id == produto_id)
-        .filter(Price.data_coleta >= data_limite)
+    data_limite = datetime.now(UTC) - timedelta(days=dias)
+
+    # Só as colunas do histórico, com o nome da loja no mesmo SELECT.
+    # lambda_stmt: a montagem do SELECT e a chave de cache do SQL compilado ficam
+    # em cache por lambda; por requisição só os parâmetros são extraídos.
+    stmt = lambda_stmt(
+        lambda: select(Price.preco_por_unidade, Price.data_coleta, Store.nome)
+        .outerjoin(Store, Store.id == Price.loja_id)
+        .where(Price.produto_id == produto_id, Price.data_coleta >= data_limite)
     )
 
     store = None
     if loja_id:
-        store = db.get(Store, loja_id)
+        store = get_store_meta(db, loja_id)
         if not store:
             raise HTTPException(status_code=404, detail="Loja não encontrada")
-        query = query.filter(Price.loja_id == loja_id)
+        stmt += lambda s: s.where(Price.loja_id == loja_id)
 
-    prices = (
-        query.order_by(Price.data_coleta.desc())
-        .limit(limit)
-        .all()
-    )
+    stmt += lambda s: s.order_by(Price.data_coleta.desc()).limit(limit)
+    prices = db.execute(stmt).all()
 
-    historico = []
-    for p in prices:
-        historico.append(PriceHistoryItem(
-            preco=p.preco_por_unidade,
-            data_coleta=p.data_coleta,
-            loja_nome=p.loja.nome if p.loja else None,
-        ))
+    historico = [
+        PriceHistoryItem(preco=preco, data_coleta=data_coleta, loja_nome=loja_nome)
+        for preco, data_coleta, loja_nome in prices
+    ]
 
-    return PriceHistoryResponse(
+    result = PriceHistoryResponse(
         produto_id=produto_id,
-        produto_descricao=product.descricao_norm,
+        produto_descricao=product["descricao_norm"],
         loja_id=loja_id,
-        loja_nome=store.nome if store else None,
+        loja_nome=store["nome"] if store else None,
         historico=historico,
     )
+    return json_response_with_etag(request, result.model_dump(mode="json"), headers=PRICE_READ_CACHE_HEADERS)
+
+
+@router.get("/history/{produto_id}/export")
+@limiter.limit("10/minute")
+def export_price_history(
+    request: Request,
+    produto_id: int,
+    db: DbSession,
+    loja_id: int | None = Query(None, description="Filtrar por loja específica"),
+    dias: int = Query(365, ge=1, le=3650, description="Histórico dos últimos N dias"),
+):
+    """
+    Exporta o histórico completo de preços de um produto em NDJSON (uma linha por preço).
+
+    Sem limite de registros: as linhas são lidas do banco em lotes por um cursor
+    do servidor e enviadas à medida que chegam, com memória constante. Para telas
+    use GET /history/{produto_id}.
+
+    - **produto_id**: ID do produto
+    - **loja_id**: Filtrar por loja específica (opcional)
+    - **dias**: Histórico dos últimos N dias (default: 365)
+    """
+    if not get_product_meta(db, produto_id):
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    if loja_id and not get_store_meta(db, loja_id):
+        raise HTTPException(status_code=404, detail="Loja não encontrada")
+
+    data_limite = datetime.now(UTC) - timedelta(days=dias)
+    stmt = (
+        select(Price.id, Price.loja_id, Store.nome.label("loja_nome"), Price.preco_por_unidade, Price.data_coleta)
+        .outerjoin(Store, Store.id == Price.loja_id)
+        .where(Price.produto_id == produto_id, Price.data_coleta >= data_limite)
+        .order_by(Price.data_coleta.desc(), Price.id.desc())
+    )
+    if loja_id:
+        stmt = stmt.where(Price.loja_id == loja_id)
+
+    def rows():
+        # Sessão própria: a do request é fechada antes do corpo ser enviado
+        with SessionLocal() as stream_db:
+            result = stream_db.execute(stmt.execution_options(stream_results=True, yield_per=PRICE_EXPORT_BATCH))
+            for partition in result.partitions():
+                yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in partition)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 @router.get("/{price_id}", response_model=PriceOut)
@@ -340,8 +531,16 @@ def delete_price(request: Request, price_id: int, db: DbSession):
     if not price:
         raise HTTPException(status_code=404, detail="Preço não encontrado")
 
+    produto_id = price.produto_id
+    canonical_id = price.canonical_id
     db.delete(price)
+    if canonical_id is not None:
+        # O preço removido pode ser o preco_atual materializado do produto canônico
+        db.flush()
+        refresh_current_prices(db, [canonical_id])
     db.commit()
+    if produto_id is not None:
+        _invalidate_price_compare(produto_id)
 
     logger.info(f"Preço removido: {price_id}")
     return {"message": "Preço removido com sucesso", "id": price_id}
@@ -4,18 +4,25 @@ import logging
 from math import ceil
 
 from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import or_
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.orm import joinedload
 
+from ..cache import cache_delete, cache_get_json, cache_set_json
 from ..database import DbSession
-from ..models import Product
-from ..schemas import ProductCreate, ProductOut
+from ..etag import json_response_with_etag
+from ..pagination import decode_cursor, encode_cursor
+from ..models import Price, Product, ReceiptItem
+from ..schemas import GTIN_PATTERN, ProductCreate, ProductOut
+from ..services.lookup_cache import forget_product, get_product_meta
+from .prices import _invalidate_price_compare
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 limiter = Limiter(key_func=get_remote_address)
 
 
@@ -34,10 +41,33 @@ class ProductUpdate(BaseModel):
 class ProductListResponse(BaseModel):
     """Response para listagem de produtos."""
     items: list[ProductOut]
-    total: int
+    total: int | None = None  # None quando with_total=false ou navegando por cursor
     page: int
     page_size: int
-    pages: int
+    pages: int | None = None
+    has_more: bool = False
+    next_cursor: str | None = None
+
+
+# === Helpers ===
+
+# Campos de ProductOut, na ordem do schema (listagem monta o dict direto da linha)
+PRODUCT_OUT_COLUMNS = (
+    Product.gtin,
+    Product.descricao_norm,
+    Product.marca,
+    Product.categoria,
+    Product.unidade_base,
+    Product.id,
+    Product.created_at,
+)
+
+# Lookup por código de barras (leitores/scanner): só hits são cacheados, 404 não
+PRODUCT_GTIN_CACHE_TTL = 300
+
+
+def _gtin_cache_key(gtin: str) -> str:
+    return f"product_gtin:{gtin}"
 
 
 # === Endpoints ===
@@ -57,7 +87,7 @@ def create_product(request: Request, payload: ProductCreate, db: DbSession):
     """
     # Se tem GTIN, verifica se já existe
     if payload.gtin:
-        existing = db.query(Product).filter(Product.gtin == payload.gtin).first()
+        existing = db.query(Product.id).filter(Product.gtin == payload.gtin).first()
         if existing:
             raise HTTPException(
                 status_code=409,
@@ -79,7 +109,9 @@ def create_product(request: Request, payload: ProductCreate, db: DbSession):
     return product
 
 
-@router.get("/", response_model=ProductListResponse)
+# Listagem quente: colunas de ProductOut direto em dicts serializados com orjson,
+# sem materializar objetos ORM nem revalidar via response_model.
+@router.get("/", response_model=None, responses={200: {"model": ProductListResponse}})
 @limiter.limit("60/minute")
 def list_products(
     request: Request,
@@ -89,19 +121,28 @@ def list_products(
     search: str | None = Query(None, description="Buscar por descrição, GTIN ou marca"),
     categoria: str | None = Query(None, description="Filtrar por categoria"),
     marca: str | None = Query(None, description="Filtrar por marca"),
+    cursor: str | None = Query(None, description="Cursor da próxima página (next_cursor)"),
+    with_total: bool = Query(True, description="Calcular total/pages (COUNT)"),
 ):
     """
     Lista produtos com paginação e filtros.
 
+    Para navegar use `cursor` com o `next_cursor` da resposta anterior;
+    `page` > 1 (OFFSET) é mantido só por compatibilidade. O COUNT (total/pages)
+    só roda na paginação por página e pode ser dispensado com `with_total=false`;
+    `has_more` vem sempre.
+
     - **search**: Busca por descrição, GTIN ou marca
     - **categoria**: Filtrar por categoria
     - **marca**: Filtrar por marca
     """
-    query = db.query(Product)
+    query = db.query(*PRODUCT_OUT_COLUMNS)
 
     # Filtros
     if search:
-        search_term = f"%{search}%"
+        # Com 3+ caracteres o ILIKE '%x%' usa os índices GIN de trigramas (pg_trgm);
+        # abaixo disso não há trigrama a buscar, então restringe a prefixo
+        search_term = f"%{search}%" if len(search) >= 3 else f"{search}%"
         query = query.filter(
             or_(
                 Product.descricao_norm.ilike(search_term),
@@ -114,25 +155,46 @@ def list_products(
     if marca:
         query = query.filter(Product.marca.ilike(f"%{marca}%"))
 
-    # Contagem total
-    total = query.count()
+    # COUNT repete o filtro inteiro (ILIKE incluso): só quando o cliente mostra "página X de Y"
+    total = pages = None
+    if with_total and not cursor:
+        total = query.count()
+        pages = ceil(total / page_size) if total > 0 else 0
 
     # Paginação
-    offset = (page - 1) * page_size
-    products = (
-        query.order_by(Product.descricao_norm)
-        .offset(offset)
-        .limit(page_size)
-        .all()
-    )
-
-    return ProductListResponse(
-        items=products,
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=ceil(total / page_size) if total > 0 else 0,
-    )
+    headers = {}
+    query = query.order_by(Product.descricao_norm, Product.id)
+    if cursor:
+        # Keyset: busca direto após a última linha da página anterior
+        cursor_desc, cursor_id = decode_cursor(cursor)
+        if not isinstance(cursor_desc, str) or not isinstance(cursor_id, int):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query = query.filter(tuple_(Product.descricao_norm, Product.id) > (cursor_desc, cursor_id))
+    elif page > 1:
+        # Paginação por OFFSET mantida por compatibilidade; prefira `cursor`
+        query = query.offset((page - 1) * page_size)
+        headers["Deprecation"] = "true"
+
+    # Uma linha a mais indica se existe próxima página sem precisar do COUNT
+    products = query.limit(page_size + 1).all()
+    has_more = len(products) > page_size
+    products = products[:page_size]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(products[-1].descricao_norm, products[-1].id)
+
+    # Telas de cadastro: sempre revalida (If-None-Match -> 304 sem corpo)
+    headers["Cache-Control"] = "no-cache"
+    return json_response_with_etag(request, {
+        "items": [row._asdict() for row in products],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "pages": pages,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }, headers=headers)
 
 
 @router.get("/{product_id}", response_model=ProductOut)
@@ -155,11 +217,26 @@ def get_product_by_gtin(request: Request, gtin: str, db: DbSession):
     """
     Busca um produto pelo código de barras (GTIN/EAN).
 
-    - **gtin**: Código de barras
+    - **gtin**: Código de barras (8 a 14 dígitos; espaços e hífens são ignorados)
     """
+    # Lido por scanner ou digitado: descarta separadores e recusa sem ir ao banco
+    # o que não pode ser um código de barras
+    gtin = gtin.strip().replace(" ", "").replace("-", "")
+    if not GTIN_PATTERN.match(gtin):
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+
+    cached = cache_get_json(_gtin_cache_key(gtin))
+    if cached is not None:
+        return cached
+
     product = db.query(Product).filter(Product.gtin == gtin).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
+    cache_set_json(
+        _gtin_cache_key(gtin),
+        ProductOut.model_validate(product).model_dump(mode="json"),
+        PRODUCT_GTIN_CACHE_TTL,
+    )
     return product
 
 
@@ -178,7 +255,7 @@ def update_product(request: Request, product_id: int, payload: ProductUpdate, db
 
     # Se está atualizando GTIN, verifica duplicidade
     if payload.gtin and payload.gtin != product.gtin:
-        existing = db.query(Product).filter(Product.gtin == payload.gtin).first()
+        existing = db.query(Product.id).filter(Product.gtin == payload.gtin).first()
         if existing:
             raise HTTPException(
                 status_code=409,
@@ -186,12 +263,16 @@ def update_product(request: Request, product_id: int, payload: ProductUpdate, db
             )
 
     # Atualiza apenas campos fornecidos
+    old_gtin = product.gtin
     update_data = payload.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
 
     db.commit()
     db.refresh(product)
+    cache_delete(*{_gtin_cache_key(g) for g in (old_gtin, product.gtin) if g})
+    forget_product(product.id)
+    _invalidate_price_compare(product.id)
 
     logger.info(f"Produto atualizado: {product.id}")
     return product
@@ -211,15 +292,23 @@ def delete_product(request: Request, product_id: int, db: DbSession):
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
-    # Verifica se tem itens vinculados
-    if product.itens:
+    # Verifica se tem itens vinculados: sonda de 1 linha no índice, sem carregar a coleção;
+    # o COUNT só roda para a mensagem de erro
+    itens = db.query(ReceiptItem.id).filter(ReceiptItem.produto_id == product_id)
+    if itens.limit(1).scalar() is not None:
+        itens_count = itens.with_entities(func.count(ReceiptItem.id)).scalar()
         raise HTTPException(
             status_code=409,
-            detail=f"Não é possível remover: produto possui {len(product.itens)} item(ns) de cupom vinculado(s)"
+            detail=f"Não é possível remover: produto possui {itens_count} item(ns) de cupom vinculado(s)"
         )
 
+    gtin = product.gtin
     db.delete(product)
     db.commit()
+    if gtin:
+        cache_delete(_gtin_cache_key(gtin))
+    forget_product(product_id)
+    _invalidate_price_compare(product_id)
 
     logger.info(f"Produto removido: {product_id}")
     return {"message": "Produto removido com sucesso", "id": product_id}
@@ -239,12 +328,22 @@ def get_product_prices(
     - **product_id**: ID do produto
     - **limit**: Quantidade de registros (default: 10)
     """
-    product = db.get(Product, product_id)
+    product = get_product_meta(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
+    # Só os `limit` mais recentes, com a loja no mesmo SELECT (sem carregar a coleção inteira)
+    latest = (
+        db.query(Price)
+        .options(joinedload(Price.loja))
+        .filter(Price.produto_id == product_id)
+        .order_by(Price.data_coleta.desc(), Price.id.desc())
+        .limit(limit)
+        .all()
+    )
+
     prices = []
-    for price in product.precos[:limit]:
+    for price in latest:
         prices.append({
             "id": price.id,
             "preco_por_unidade": price.preco_por_unidade,
@@ -260,6 +359,6 @@ def get_product_prices(
 
     return {
         "product_id": product_id,
-        "descricao": product.descricao_norm,
+        "descricao": product["descricao_norm"],
         "prices": prices,
     }
@@ -9,12 +9,13 @@ from redis import Redis
 from rq import Queue
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import func
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..database import DbSession
 from ..models import CanonicalProduct, Price, Product, ProductAlias, Receipt, ReceiptItem, Store
+from ..services.current_prices import refresh_current_prices
 from ..services.product_normalizer import clean_product_description, find_or_create_canonical
 from ..schemas import (
     CHAVE_PATTERN,
@@ -155,6 +156,8 @@ def create_receipt_manual(request: Request, payload: ReceiptManualInput, db: DbS
     chave = payload.chave_acesso
     
     # Verifica se já existe
+    # Produtos canônicos cujos preços saem com o cupom antigo: o preço atual deles é recalculado
+    replaced_canonical_ids: set[int] = set()
     existing = db.get(Receipt, chave)
     if existing:
         if existing.status == "processado":
@@ -169,6 +172,11 @@ def create_receipt_manual(request: Request, payload: ReceiptManualInput, db: DbS
             logger.info(f"Cupom {chave} existe com status {existing.status}, recriando...")
         
         # Deleta itens antigos, preços vinculados ao cupom, e o cupom
+        replaced_canonical_ids = set(
+            db.scalars(
+                select(Price.canonical_id).where(Price.cupom_id == chave, Price.canonical_id.isnot(None)).distinct()
+            )
+        )
         db.query(ReceiptItem).filter(ReceiptItem.cupom_id == chave).delete()
         db.query(Price).filter(Price.cupom_id == chave).delete()
         db.delete(existing)
@@ -201,21 +209,26 @@ def create_receipt_manual(request: Request, payload: ReceiptManualInput, db: DbS
         )
         db.add(receipt)
         
-        # 3. Processa os itens
+        # 3. Processa os itens: resolve os produtos item a item e acumula as linhas
+        # de itens/preços para gravar com um INSERT em lote cada no final
+        priced_canonical_ids: set[int] = set()
+        item_rows: list[dict] = []
+        price_rows: list[dict] = []
+        data_coleta = payload.data_emissao or datetime.now(UTC)
         for item_data in payload.itens:
-            # Cria o item do cupom
-            receipt_item = ReceiptItem(
-                cupom_id=chave,
-                seq=item_data.seq,
-                descricao_raw=item_data.descricao,
-                qtd=item_data.qtd,
-                unidade=item_data.unidade,
-                preco_unit=item_data.preco_unit,
-                preco_total=item_data.preco_total,
-                desconto=item_data.desconto,
-                gtin_opt=item_data.gtin,
-            )
-            db.add(receipt_item)
+            item_row = {
+                "cupom_id": chave,
+                "seq": item_data.seq,
+                "descricao_raw": item_data.descricao,
+                "qtd": item_data.qtd,
+                "unidade": item_data.unidade,
+                "preco_unit": item_data.preco_unit,
+                "preco_total": item_data.preco_total,
+                "desconto": item_data.desconto,
+                "gtin_opt": item_data.gtin,
+                "produto_id": None,
+            }
+            item_rows.append(item_row)
             
             # Limpa a descrição removendo "(Código: xxxxx)"
             descricao = clean_product_description(item_data.descricao)
@@ -233,16 +246,16 @@ def create_receipt_manual(request: Request, payload: ReceiptManualInput, db: DbS
                 
                 # Registra o preço vinculado ao produto canônico
                 if item_data.preco_unit > 0:
-                    price = Price(
-                        canonical_id=canonical.id,
-                        loja_id=store.id,
-                        preco_por_unidade=item_data.preco_unit,
-                        unidade_base=item_data.unidade,
-                        data_coleta=payload.data_emissao or datetime.now(UTC),
-                        fonte="manual",
-                        cupom_id=chave,
-                    )
-                    db.add(price)
+                    price_rows.append({
+                        "canonical_id": canonical.id,
+                        "loja_id": store.id,
+                        "preco_por_unidade": item_data.preco_unit,
+                        "unidade_base": item_data.unidade,
+                        "data_coleta": data_coleta,
+                        "fonte": "manual",
+                        "cupom_id": chave,
+                    })
+                    priced_canonical_ids.add(canonical.id)
                     
                 logger.info(f"Item '{descricao}' -> Canônico '{canonical.nome}' (novo={is_new})")
                 
@@ -263,8 +276,17 @@ def create_receipt_manual(request: Request, payload: ReceiptManualInput, db: DbS
                     db.add(product)
                     db.flush()
                     
-                receipt_item.produto_id = product.id
+                item_row["produto_id"] = product.id
         
+        # Cupom/loja/produtos pendentes primeiro (FKs), depois um INSERT por tabela
+        db.flush()
+        if item_rows:
+            db.execute(insert(ReceiptItem), item_rows)
+        if price_rows:
+            db.execute(insert(Price), price_rows)
+
+        # Atualiza o preço atual materializado na mesma transação dos preços
+        refresh_current_prices(db, priced_canonical_ids | replaced_canonical_ids)
         db.commit()
         
         logger.info(f"Cupom {chave} criado manualmente: {len(payload.itens)} itens")
@@ -559,19 +581,25 @@ def process_receipt(request: Request, chave: str, db: DbSession):
         
         # 5. Processa os itens
         itens = parse_result.get("itens", [])
+
+        # Produtos já cadastrados do cupom inteiro: uma consulta por chave (GTIN e
+        # descrição) em vez de até duas por item
+        gtins = {item.get("gtin") for item in itens if item.get("gtin")}
+        descricoes = {item.get("descricao", "").strip().upper() for item in itens} - {""}
+        products_by_gtin: dict[str, Product] = {}
+        products_by_descricao: dict[str, Product] = {}
+        if gtins:
+            for p in db.query(Product).filter(Product.gtin.in_(gtins)).order_by(Product.id):
+                products_by_gtin.setdefault(p.gtin, p)
+        if descricoes:
+            for p in db.query(Product).filter(Product.descricao_norm.in_(descricoes)).order_by(Product.id):
+                products_by_descricao.setdefault(p.descricao_norm, p)
+
+        # Linhas de itens/preços acumuladas e gravadas com um INSERT em lote cada no final
+        item_rows: list[dict] = []
+        price_rows: list[dict] = []
+        data_coleta = receipt.data_emissao or datetime.now(UTC)
         for idx, item_data in enumerate(itens, 1):
-            # Cria o item do cupom
-            receipt_item = ReceiptItem(
-                cupom_id=chave,
-                seq=idx,
-                descricao_raw=item_data.get("descricao", ""),
-                qtd=item_data.get("qtd", 1),
-                unidade=item_data.get("unidade", "un"),
-                preco_unit=item_data.get("preco_unit", 0),
-                preco_total=item_data.get("preco_total", 0),
-                gtin_opt=item_data.get("gtin"),
-            )
-            db.add(receipt_item)
             
             # Cria ou busca o produto
             descricao = item_data.get("descricao", "").strip().upper()
@@ -579,9 +607,9 @@ def process_receipt(request: Request, chave: str, db: DbSession):
             
             product = None
             if gtin:
-                product = db.query(Product).filter(Product.gtin == gtin).first()
+                product = products_by_gtin.get(gtin)
             if not product and descricao:
-                product = db.query(Product).filter(Product.descricao_norm == descricao).first()
+                product = products_by_descricao.get(descricao)
             
             if not product and descricao:
                 product = Product(
@@ -591,21 +619,41 @@ def process_receipt(request: Request, chave: str, db: DbSession):
                 )
                 db.add(product)
                 db.flush()
+                # Itens repetidos no mesmo cupom reaproveitam o produto recém-criado
+                if gtin:
+                    products_by_gtin[gtin] = product
+                products_by_descricao[descricao] = product
             
             # Registra o preço
             if product and store and item_data.get("preco_unit", 0) > 0:
-                price = Price(
-                    produto_id=product.id,
-                    loja_id=store.id,
-                    preco_por_unidade=item_data.get("preco_unit", 0),
-                    unidade_base=item_data.get("unidade", "un"),
-                    data_coleta=receipt.data_emissao or datetime.now(UTC),
-                    fonte="cupom",
-                    cupom_id=chave,
-                )
-                db.add(price)
+                price_rows.append({
+                    "produto_id": product.id,
+                    "loja_id": store.id,
+                    "preco_por_unidade": item_data.get("preco_unit", 0),
+                    "unidade_base": item_data.get("unidade", "un"),
+                    "data_coleta": data_coleta,
+                    "fonte": "cupom",
+                    "cupom_id": chave,
+                })
             
-            receipt_item.produto_id = product.id if product else None
+            item_rows.append({
+                "cupom_id": chave,
+                "seq": idx,
+                "descricao_raw": item_data.get("descricao", ""),
+                "qtd": item_data.get("qtd", 1),
+                "unidade": item_data.get("unidade", "un"),
+                "preco_unit": item_data.get("preco_unit", 0),
+                "preco_total": item_data.get("preco_total", 0),
+                "gtin_opt": item_data.get("gtin"),
+                "produto_id": product.id if product else None,
+            })
+        
+        # Cupom/loja/produtos pendentes primeiro (FKs), depois um INSERT por tabela
+        db.flush()
+        if item_rows:
+            db.execute(insert(ReceiptItem), item_rows)
+        if price_rows:
+            db.execute(insert(Price), price_rows)
         
         # 6. Finaliza
         receipt.status = "processado"
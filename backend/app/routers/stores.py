@@ -6,11 +6,12 @@ from math import ceil
 from fastapi import APIRouter, HTTPException, Query, Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 
 from ..database import DbSession
-from ..models import Store
+from ..models import Receipt, Store
 from ..schemas import StoreCreate, StoreOut
+from ..services.lookup_cache import forget_store
 
 logger = logging.getLogger(__name__)
 
@@ -64,7 +65,7 @@ def create_store(request: Request, payload: StoreCreate, db: DbSession):
     - **cep**: CEP
     """
     # Verifica se CNPJ já existe
-    existing = db.query(Store).filter(Store.cnpj == payload.cnpj).first()
+    existing = db.query(Store.id).filter(Store.cnpj == payload.cnpj).first()
     if existing:
         raise HTTPException(
             status_code=409,
@@ -196,6 +197,7 @@ def update_store(request: Request, store_id: int, payload: StoreUpdate, db: DbSe
 
     db.commit()
     db.refresh(store)
+    forget_store(store.id)
 
     logger.info(f"Loja atualizada: {store.id}")
     return store
@@ -215,15 +217,19 @@ def delete_store(request: Request, store_id: int, db: DbSession):
     if not store:
         raise HTTPException(status_code=404, detail="Loja não encontrada")
 
-    # Verifica se tem cupons vinculados
-    if store.cupons:
+    # Verifica se tem cupons vinculados: sonda de 1 linha no índice, sem carregar a coleção;
+    # o COUNT só roda para a mensagem de erro
+    cupons = db.query(Receipt.chave_acesso).filter(Receipt.loja_id == store_id)
+    if cupons.limit(1).scalar() is not None:
+        cupons_count = cupons.with_entities(func.count(Receipt.chave_acesso)).scalar()
         raise HTTPException(
             status_code=409,
-            detail=f"Não é possível remover: loja possui {len(store.cupons)} cupom(s) vinculado(s)"
+            detail=f"Não é possível remover: loja possui {cupons_count} cupom(s) vinculado(s)"
         )
 
     db.delete(store)
     db.commit()
+    forget_store(store_id)
 
     logger.info(f"Loja removida: {store_id}")
     return {"message": "Loja removida com sucesso", "id": store_id}
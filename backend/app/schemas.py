@@ -36,11 +36,16 @@ class JobStatus(str, Enum):
 
 CHAVE_PATTERN = re.compile(r"^\d{44}$")
 CNPJ_PATTERN = re.compile(r"^\d{14}$")
+CHAVE_SEARCH_PATTERN = re.compile(r"\d{44}")
+GTIN_PATTERN = re.compile(r"^\d{8,14}$")  # EAN-8, UPC-A (12), EAN-13, GTIN-14
 
 
 def extract_chave_from_text(text: str) -> str | None:
     """Extrai chave de 44 dígitos de um texto (QR code, URL, etc)."""
-    match = re.search(r"\d{44}", text)
+    # Caminho rápido: texto já é a chave pura
+    if len(text) == 44 and text.isascii() and text.isdigit():
+        return text
+    match = CHAVE_SEARCH_PATTERN.search(text)
     return match.group(0) if match else None
 
 
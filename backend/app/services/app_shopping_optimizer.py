@@ -9,7 +9,7 @@ from collections import defaultdict
 from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 
-from ..models import AppShoppingList, Price, Store
+from ..models import AppShoppingList, CanonicalProduct, Price, Store
 from .city_location import LatLng, haversine_km, resolve_city_centroid
 
 logger = logging.getLogger(__name__)
@@ -25,6 +25,7 @@ class ItemPrice:
     price_date: datetime
     quantity: float
     subtotal: float
+    product_name: str = "Produto"
 
 
 @dataclass
@@ -258,8 +259,9 @@ class AppShoppingOptimizer:
             .subquery()
         )
 
+        # Nome do produto vem no mesmo SELECT (evita consulta extra ao montar a resposta)
         prices = (
-            self.db.query(Price, Store)
+            self.db.query(Price, Store, CanonicalProduct.nome)
             .join(Store, Price.loja_id == Store.id)
             .join(
                 latest_price_subq,
@@ -269,12 +271,13 @@ class AppShoppingOptimizer:
                     Price.data_coleta == latest_price_subq.c.max_date,
                 ),
             )
+            .outerjoin(CanonicalProduct, CanonicalProduct.id == Price.canonical_id)
             .all()
         )
 
         canonical_item_map = {it.canonical_id: it for it in shopping_list.items}
         out: list[ItemPrice] = []
-        for price, store in prices:
+        for price, store, product_name in prices:
             item = canonical_item_map.get(price.canonical_id)
             if not item:
                 continue
@@ -289,6 +292,7 @@ class AppShoppingOptimizer:
                     price_date=price.data_coleta,
                     quantity=item.quantity,
                     subtotal=price.preco_por_unidade * item.quantity,
+                    product_name=product_name or "Produto",
                 )
             )
 
@@ -368,52 +372,53 @@ class AppShoppingOptimizer:
             return [], list(prices_by_item.keys())
 
         all_item_ids = list(prices_by_item.keys())
-        INF = 10**12
         penalty_missing = 10**9
 
+        qty_by_item = {item_id: float(prices[0].quantity) for item_id, prices in prices_by_item.items()}
+
+        # Custo (preço x quantidade) de cada item por loja, pré-calculado uma vez
+        cost_by_store: dict[int, list[tuple[int, float]]] = {
+            sid: [(item_id, float(p.price) * qty_by_item[item_id]) for item_id, p in best.items()]
+            for sid, best in store_item_best.items()
+        }
+
         selected: list[int] = []
+        selected_set: set[int] = set()
         best_by_item: dict[int, ItemPrice] = {}
+        current_cost: dict[int, float] = {}
 
         for _ in range(min(max_stores, len(candidate_stores))):
             best_store: int | None = None
-            best_score = None
+            best_gain = None
 
+            # Minimizar custo + penalidade dos faltantes equivale a maximizar o ganho
+            # sobre a seleção atual; só os itens que a loja tem mudam o placar.
             for sid in candidate_stores:
-                if sid in selected:
+                if sid in selected_set:
                     continue
 
-                total = 0.0
-                missing = 0
-                for item_id in all_item_ids:
-                    current = best_by_item.get(item_id)
-                    cand = store_item_best[sid].get(item_id)
-                    if current is None and cand is None:
-                        missing += 1
-                        continue
-
-                    best_price = current.price if current else INF
-                    if cand and cand.price < best_price:
-                        best_price = cand.price
-                    if best_price >= INF:
-                        missing += 1
-                        continue
-
-                    qty = prices_by_item[item_id][0].quantity
-                    total += float(best_price) * float(qty)
-
-                score = float(total) + float(missing) * penalty_missing
-                if best_score is None or score < best_score:
-                    best_score = score
+                gain = 0.0
+                for item_id, cost in cost_by_store[sid]:
+                    current = current_cost.get(item_id)
+                    if current is None:
+                        gain += penalty_missing - cost
+                    elif cost < current:
+                        gain += current - cost
+
+                if best_gain is None or gain > best_gain:
+                    best_gain = gain
                     best_store = sid
 
             if best_store is None:
                 break
 
             selected.append(best_store)
+            selected_set.add(best_store)
             for item_id, cand in store_item_best[best_store].items():
                 current = best_by_item.get(item_id)
                 if current is None or cand.price < current.price:
                     best_by_item[item_id] = cand
+                    current_cost[item_id] = float(cand.price) * qty_by_item[item_id]
 
             # Se já cobrimos todos os itens, podemos parar cedo.
             if len(best_by_item) == len(all_item_ids):
@@ -423,14 +428,19 @@ class AppShoppingOptimizer:
         items_outside: list[int] = []
         for item_id in all_item_ids:
             best = best_by_item.get(item_id)
-            if best is None or best.store_id not in selected:
+            if best is None or best.store_id not in selected_set:
                 items_outside.append(item_id)
                 continue
             allocation[best.store_id].append(best)
 
+        # Uma única consulta para as lojas alocadas (em vez de um db.get por loja)
+        stores_by_id = {}
+        if allocation:
+            stores_by_id = {s.id: s for s in self.db.query(Store).filter(Store.id.in_(list(allocation.keys()))).all()}
+
         result: list[StoreAllocation] = []
         for store_id, items in allocation.items():
-            store = self.db.get(Store, store_id)
+            store = stores_by_id.get(store_id)
             store_name = (store.nome_fantasia or store.nome) if store else "Desconhecido"
             store_address = ""
             if store:
@@ -458,7 +468,7 @@ class AppShoppingOptimizer:
             store_items[ip.store_id].add(ip.item_id)
 
         all_items = {ip.item_id for ip in item_prices}
-        complete_stores = [sid for sid, items in store_items.items() if items == all_items]
+        complete_stores = {sid for sid, items in store_items.items() if items == all_items}
 
         if not complete_stores:
             prices_by_item: dict[int, list[float]] = defaultdict(list)
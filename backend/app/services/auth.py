@@ -1,23 +1,37 @@
 """Serviço de autenticação e autorização."""
 
 import hashlib
+import logging
 import secrets
+import threading
+import time
+from collections import deque
 from datetime import UTC, datetime, timedelta
 from typing import Optional
 
 import bcrypt
 import jwt
-from sqlalchemy.orm import Session
+from cachetools import TTLCache
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
 
 from ..config import settings
+from ..database import SessionLocal
 from ..models import AuditLog, PasswordResetToken, Permission, Role, User, UserSession
 
+logger = logging.getLogger(__name__)
+
 # Configurações JWT
 JWT_SECRET = settings.secret_key
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
+# token -> payload já verificado; evita refazer HMAC + parse do mesmo token a cada requisição.
+# Só guarda claims assinados: sessão/usuário continuam sendo validados no banco.
+_token_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+_token_cache_lock = threading.Lock()
+
 
 # =============================================================================
 # FUNÇÕES DE HASH
@@ -77,19 +91,34 @@ def create_refresh_token(user_id: int, session_id: int) -> str:
 
 def decode_token(token: str) -> Optional[dict]:
     """Decodifica e valida um token JWT."""
+    with _token_cache_lock:
+        payload = _token_cache.get(token)
+    if payload is not None:
+        # O TTL do cache pode passar do exp do token
+        if payload.get("exp", 0) > datetime.now(UTC).timestamp():
+            return payload
+        return None
+
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    with _token_cache_lock:
+        _token_cache[token] = payload
+    return payload
+
 
 # =============================================================================
 # SERVIÇO DE AUTENTICAÇÃO
 # =============================================================================
 
+# Role (many-to-one) via JOIN e permissões (many-to-many) em um SELECT IN:
+# evita os lazy loads de user.role / role.permissions em cada requisição
+_USER_ROLE_LOADER = joinedload(User.role).selectinload(Role.permissions)
+
 class AuthService:
     """Serviço para operações de autenticação."""
 
@@ -98,7 +127,7 @@ class AuthService:
 
     def authenticate(self, email: str, password: str) -> Optional[User]:
         """Autentica um usuário por email e senha."""
-        user = self.db.query(User).filter(
+        user = self.db.query(User).options(_USER_ROLE_LOADER).filter(
             User.email == email.lower(),
             User.is_active == True
         ).first()
@@ -194,29 +223,25 @@ class AuthService:
 
     def logout(self, session_id: int, user_id: int) -> bool:
         """Invalida uma sessão específica."""
-        session = self.db.query(UserSession).filter(
+        updated = self.db.query(UserSession).filter(
             UserSession.id == session_id,
             UserSession.user_id == user_id
-        ).first()
-        
-        if session:
-            session.is_active = False
-            self.db.commit()
-            return True
-        return False
+        ).update({"is_active": False}, synchronize_session=False)
+        self.db.commit()
+        return updated > 0
 
     def logout_all(self, user_id: int) -> int:
         """Invalida todas as sessões de um usuário."""
         result = self.db.query(UserSession).filter(
             UserSession.user_id == user_id,
             UserSession.is_active == True
-        ).update({"is_active": False})
+        ).update({"is_active": False}, synchronize_session=False)
         self.db.commit()
         return result
 
     def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Busca usuário por ID."""
-        return self.db.query(User).filter(
+        return self.db.query(User).options(_USER_ROLE_LOADER).filter(
             User.id == user_id,
             User.is_active == True
         ).first()
@@ -332,6 +357,111 @@ class AuditService:
         return log
 
 
+# Fila de auditoria: os handlers só enfileiram (O(1), sem I/O) e uma thread grava em lote,
+# um INSERT multi-linha + um commit por lote (rajadas de login_failed não viram um commit por linha)
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.5
+AUDIT_BATCH_SIZE = 500
+
+_audit_queue: deque[dict] = deque()
+_audit_flusher: Optional[threading.Thread] = None
+_audit_flusher_lock = threading.Lock()
+
+
+def enqueue_audit(
+    action: str,
+    user_id: Optional[int] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    details: Optional[str] = None,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None
+) -> None:
+    """Enfileira um registro de auditoria para gravação em lote."""
+    # Cortado no tamanho das colunas: um User-Agent enorme (vem direto do header)
+    # não pode fazer o INSERT do lote inteiro falhar
+    _audit_queue.append({
+        "user_id": user_id,
+        "action": action[:100],
+        "resource_type": _clamp(resource_type, 50),
+        "resource_id": _clamp(resource_id, 100),
+        "details": details,
+        "ip_address": _clamp(ip_address, 45),
+        "user_agent": _clamp(user_agent, 500),
+        "created_at": datetime.now(UTC),
+    })
+    _ensure_audit_flusher()
+
+
+def _clamp(value: Optional[str], size: int) -> Optional[str]:
+    return value[:size] if value else value
+
+
+def _insert_audit_rows_one_by_one(batch: list[dict]) -> int:
+    """Fallback de lote que falhou: grava linha a linha e descarta só as rejeitadas."""
+    written = 0
+    db = SessionLocal()
+    try:
+        for row in batch:
+            try:
+                db.execute(insert(AuditLog), row)
+                db.commit()
+                written += 1
+            except Exception:
+                db.rollback()
+                logger.exception("Registro de auditoria rejeitado (action=%s)", row.get("action"))
+    finally:
+        db.close()
+    return written
+
+
+def flush_audit_queue() -> int:
+    """Grava os registros pendentes em lotes. Retorna quantos foram gravados."""
+    written = 0
+    while _audit_queue:
+        batch: list[dict] = []
+        while len(batch) < AUDIT_BATCH_SIZE:
+            try:
+                batch.append(_audit_queue.popleft())
+            except IndexError:
+                break
+        if not batch:
+            break
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(AuditLog), batch)
+            db.commit()
+            written += len(batch)
+            continue
+        except Exception:
+            db.rollback()
+            logger.exception("Falha ao gravar lote de %d registros de auditoria; gravando um a um", len(batch))
+        finally:
+            db.close()
+        written += _insert_audit_rows_one_by_one(batch)
+    return written
+
+
+def _audit_flush_loop() -> None:
+    while True:
+        time.sleep(AUDIT_FLUSH_INTERVAL_SECONDS)
+        try:
+            flush_audit_queue()
+        except Exception:
+            logger.exception("Erro no gravador de auditoria")
+
+
+def _ensure_audit_flusher() -> None:
+    # Iniciada sob demanda: cada worker (processo) tem a sua
+    global _audit_flusher
+    if _audit_flusher is not None and _audit_flusher.is_alive():
+        return
+    with _audit_flusher_lock:
+        if _audit_flusher is None or not _audit_flusher.is_alive():
+            _audit_flusher = threading.Thread(target=_audit_flush_loop, name="audit-flusher", daemon=True)
+            _audit_flusher.start()
+
+
 # =============================================================================
 # SEED DE DADOS INICIAIS
 # =============================================================================
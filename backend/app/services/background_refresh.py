@@ -0,0 +1,37 @@
+"""Execução em background de recomputações caras (views/rollups) disparadas por requisições."""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingRefresher:
+    """Roda `fn` numa thread daemon; pedidos feitos durante uma execução viram uma só nova execução."""
+
+    def __init__(self, name: str, fn: Callable[[], object]):
+        self.name = name
+        self.fn = fn
+        self._lock = threading.Lock()
+        self._requested = False
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self) -> None:
+        with self._lock:
+            self._requested = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._requested:
+                    self._thread = None
+                    return
+                self._requested = False
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("Erro em %s", self.name)
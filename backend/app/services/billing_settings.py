@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+
+from cachetools import TTLCache
+from sqlalchemy.orm import Session
+
+from ..models import AppBillingSettings
+
+_SETTINGS_CACHE_KEY = "settings"
+_settings_cache: TTLCache = TTLCache(maxsize=1, ttl=60)
+_settings_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class BillingSettingsSnapshot:
+    """Cópia imutável de AppBillingSettings (segura para compartilhar entre sessões)."""
+
+    id: int
+    is_active: bool
+    trial_days: int
+    monthly_price_cents: int
+    referral_credit_cents: int
+    receipt_credit_cents: int
+    referral_credit_limit_per_month: int
+    receipt_credit_limit_per_month: int
+
+
+def get_or_create_billing_settings(db: Session) -> AppBillingSettings:
+    """Retorna a linha singleton de configurações, criando com os defaults se não existir."""
+    s = db.query(AppBillingSettings).order_by(AppBillingSettings.id.asc()).first()
+    if s:
+        return s
+    s = AppBillingSettings(
+        trial_days=30,
+        monthly_price_cents=1500,
+        referral_credit_cents=200,
+        receipt_credit_cents=100,
+        referral_credit_limit_per_month=5,
+        receipt_credit_limit_per_month=5,
+        is_active=True,
+    )
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    return s
+
+
+def get_cached_billing_settings(db: Session) -> BillingSettingsSnapshot:
+    """Configurações de billing com cache em processo (TTL de 60s).
+
+    Use `invalidate_billing_settings_cache` após alterar a linha no banco.
+    """
+    with _settings_lock:
+        cached = _settings_cache.get(_SETTINGS_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    s = get_or_create_billing_settings(db)
+    snapshot = BillingSettingsSnapshot(
+        id=int(s.id),
+        is_active=bool(s.is_active),
+        trial_days=int(s.trial_days),
+        monthly_price_cents=int(s.monthly_price_cents),
+        referral_credit_cents=int(s.referral_credit_cents),
+        receipt_credit_cents=int(s.receipt_credit_cents),
+        referral_credit_limit_per_month=int(s.referral_credit_limit_per_month),
+        receipt_credit_limit_per_month=int(s.receipt_credit_limit_per_month),
+    )
+    with _settings_lock:
+        _settings_cache[_SETTINGS_CACHE_KEY] = snapshot
+    return snapshot
+
+
+def invalidate_billing_settings_cache() -> None:
+    with _settings_lock:
+        _settings_cache.clear()
@@ -0,0 +1,45 @@
+"""Categorias de produtos canônicos via materialized view `canonical_categories`.
+
+A leitura não varre produtos_canonicos; a view é atualizada em background
+(REFRESH CONCURRENTLY) após escritas do router e quando fica velha, o que cobre
+produtos criados pela ingestão de cupons em outros processos.
+"""
+
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..cache import cache_delete
+from ..database import engine
+from .background_refresh import CoalescingRefresher
+
+CATEGORIES_CACHE_KEY = "canonical:categories"
+CATEGORIES_VIEW_MAX_AGE_SECONDS = 300
+
+_last_refresh = 0.0  # monotonic; 0 = ainda não atualizada por este processo
+
+
+def get_categories(db: Session) -> list[str]:
+    return list(db.execute(text("SELECT categoria FROM canonical_categories ORDER BY categoria")).scalars())
+
+
+def categories_view_is_stale() -> bool:
+    return time.monotonic() - _last_refresh > CATEGORIES_VIEW_MAX_AGE_SECONDS
+
+
+def refresh_categories_view() -> None:
+    """REFRESH CONCURRENTLY (não bloqueia leitores) e invalida o cache das respostas."""
+    global _last_refresh
+    with engine.begin() as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY canonical_categories"))
+    _last_refresh = time.monotonic()
+    cache_delete(CATEGORIES_CACHE_KEY)
+
+
+_refresher = CoalescingRefresher("canonical-categories-refresh", refresh_categories_view)
+
+
+def schedule_categories_refresh() -> None:
+    """Agenda um REFRESH em background; pedidos durante um refresh em andamento viram um só."""
+    _refresher.schedule()
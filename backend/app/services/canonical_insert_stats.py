@@ -0,0 +1,64 @@
+"""Rollup `canonical_insert_stats`: cupons distintos por produto canônico.
+
+O GROUP BY com COUNT(DISTINCT cupom_id) sobre precos sai do caminho dos KPIs;
+o endpoint lê o top 10 do rollup e agenda o recálculo quando ele fica velho.
+"""
+
+from datetime import timedelta
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..database import engine
+from ..models import CanonicalInsertStat, CanonicalProduct, Price, utc_now
+from .background_refresh import CoalescingRefresher
+
+INSERT_STATS_MAX_AGE = timedelta(hours=1)
+
+
+def refresh_insert_stats() -> None:
+    """Recalcula o rollup inteiro numa transação (upsert dos contadores + remoção dos que zeraram)."""
+    counted = Price.canonical_id.isnot(None) & Price.cupom_id.isnot(None)
+    agg = (
+        select(Price.canonical_id, func.count(func.distinct(Price.cupom_id)), func.now())
+        .where(counted)
+        .group_by(Price.canonical_id)
+    )
+    stmt = pg_insert(CanonicalInsertStat).from_select(["canonical_id", "inserts", "updated_at"], agg)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CanonicalInsertStat.canonical_id],
+        set_={"inserts": stmt.excluded.inserts, "updated_at": stmt.excluded.updated_at},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
+        conn.execute(
+            delete(CanonicalInsertStat).where(
+                ~exists().where(counted, Price.canonical_id == CanonicalInsertStat.canonical_id)
+            )
+        )
+
+
+_refresher = CoalescingRefresher("canonical-insert-stats-refresh", refresh_insert_stats)
+
+
+def schedule_insert_stats_refresh() -> None:
+    _refresher.schedule()
+
+
+def top_inserted(db: Session, limit: int = 10) -> list[dict]:
+    """Top produtos por cupons distintos; agenda o recálculo se o rollup estiver velho (ou vazio)."""
+    last_update = db.query(func.max(CanonicalInsertStat.updated_at)).scalar()
+    if last_update is None or last_update < utc_now() - INSERT_STATS_MAX_AGE:
+        schedule_insert_stats_refresh()
+
+    rows = (
+        db.query(CanonicalInsertStat.canonical_id, CanonicalInsertStat.inserts, CanonicalProduct.nome, CanonicalProduct.categoria)
+        .join(CanonicalProduct, CanonicalProduct.id == CanonicalInsertStat.canonical_id)
+        .order_by(CanonicalInsertStat.inserts.desc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {"canonical_id": int(cid), "nome": nome, "categoria": categoria, "inserts": int(ins)}
+        for cid, ins, nome, categoria in rows
+    ]
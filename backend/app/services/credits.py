@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from datetime import UTC, datetime
+
+from cachetools import TTLCache
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from ..models import AppCreditLedger, AppUser
+
+# (user_id, ano, mês, entry_type) -> lançamentos no mês; TTL curto porque outros workers também gravam
+_monthly_count_cache: TTLCache = TTLCache(maxsize=4096, ttl=30)
+_monthly_count_lock = threading.Lock()
+
+
+def ledger_balance_cents(db: Session, user_id: int) -> int:
+    """Saldo calculado diretamente do ledger (fonte de verdade)."""
+    balance = (
+        db.query(func.coalesce(func.sum(AppCreditLedger.amount_cents), 0))
+        .filter(AppCreditLedger.user_id == user_id)
+        .scalar()
+    )
+    return int(balance or 0)
+
+
+def reconcile_credit_balances(db: Session) -> int:
+    """Recalcula app_users.credit_balance_cents a partir do ledger.
+
+    O saldo é mantido pelo trigger do ledger; este job corrige eventuais
+    divergências (ex.: bancos criados sem o trigger). Retorna o número de
+    usuários corrigidos.
+    """
+    ledger_sum = (
+        select(func.coalesce(func.sum(AppCreditLedger.amount_cents), 0))
+        .where(AppCreditLedger.user_id == AppUser.id)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(AppUser)
+        .where(AppUser.credit_balance_cents != ledger_sum)
+        .values(credit_balance_cents=ledger_sum)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return int(result.rowcount or 0)
+
+
+def monthly_entry_count(db: Session, user_id: int, entry_type: str, now: datetime) -> int:
+    """Quantidade de lançamentos `entry_type` do usuário no mês de `now` (cache de 30s)."""
+    key = (int(user_id), now.year, now.month, entry_type)
+    with _monthly_count_lock:
+        cached = _monthly_count_cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = datetime(now.year, now.month, 1, tzinfo=UTC)
+    count = (
+        db.query(func.count(AppCreditLedger.id))
+        .filter(
+            AppCreditLedger.user_id == user_id,
+            AppCreditLedger.entry_type == entry_type,
+            AppCreditLedger.created_at >= start,
+        )
+        .scalar()
+    )
+    count = int(count or 0)
+    with _monthly_count_lock:
+        _monthly_count_cache[key] = count
+    return count
+
+
+def note_monthly_entry(user_id: int, entry_type: str, now: datetime) -> None:
+    """Incrementa a contagem em cache após gravar um novo lançamento."""
+    key = (int(user_id), now.year, now.month, entry_type)
+    with _monthly_count_lock:
+        cached = _monthly_count_cache.get(key)
+        if cached is not None:
+            _monthly_count_cache[key] = cached + 1
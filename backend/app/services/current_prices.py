@@ -0,0 +1,78 @@
+"""Preço atual materializado em produtos_canonicos.
+
+preco_atual = menor preço entre os preços da data mais recente de cada loja.
+Atualizado por quem grava preços canônicos (ver `refresh_current_prices`).
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.orm import Session
+
+from ..models import CanonicalProduct, Price
+
+
+def refresh_current_prices(db: Session, canonical_ids: Optional[Iterable[int]] = None) -> int:
+    """Recalcula preco_atual/preco_data/preco_loja_id dos produtos informados.
+
+    Sem `canonical_ids` recalcula todos (job de correção de divergências).
+    Não faz commit: roda na transação de quem gravou os preços. Retorna o
+    número de produtos atualizados.
+    """
+    ids = None if canonical_ids is None else sorted(set(canonical_ids))
+    if ids == []:
+        return 0
+
+    price_filter = [Price.canonical_id.isnot(None), Price.data_coleta.isnot(None)]
+    if ids is not None:
+        price_filter.append(Price.canonical_id.in_(ids))
+
+    # Preço da data mais recente de cada (produto, loja); empate na data fica com o menor preço
+    latest = (
+        select(Price.canonical_id, Price.loja_id, Price.preco_por_unidade, Price.data_coleta)
+        .where(*price_filter)
+        .order_by(Price.canonical_id, Price.loja_id, Price.data_coleta.desc(), Price.preco_por_unidade)
+        .distinct(Price.canonical_id, Price.loja_id)
+        .subquery()
+    )
+    # Menor deles por produto (empate no preço fica com o mais recente)
+    best = (
+        select(latest.c.canonical_id, latest.c.loja_id, latest.c.preco_por_unidade, latest.c.data_coleta)
+        .order_by(latest.c.canonical_id, latest.c.preco_por_unidade, latest.c.data_coleta.desc())
+        .distinct(latest.c.canonical_id)
+        .subquery()
+    )
+
+    # updated_at explícito: mudança de preço não é edição do cadastro do produto
+    updated = db.execute(
+        update(CanonicalProduct)
+        .where(
+            CanonicalProduct.id == best.c.canonical_id,
+            CanonicalProduct.preco_atual.is_distinct_from(best.c.preco_por_unidade)
+            | CanonicalProduct.preco_data.is_distinct_from(best.c.data_coleta)
+            | CanonicalProduct.preco_loja_id.is_distinct_from(best.c.loja_id),
+        )
+        .values(
+            preco_atual=best.c.preco_por_unidade,
+            preco_data=best.c.data_coleta,
+            preco_loja_id=best.c.loja_id,
+            updated_at=CanonicalProduct.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    # Produtos que ficaram sem preço (ex.: preços movidos num merge)
+    has_price = select(Price.id).where(Price.canonical_id == CanonicalProduct.id, Price.data_coleta.isnot(None)).exists()
+    clear_filter = [CanonicalProduct.preco_atual.isnot(None), ~has_price]
+    if ids is not None:
+        clear_filter.append(CanonicalProduct.id.in_(ids))
+    cleared = db.execute(
+        update(CanonicalProduct)
+        .where(and_(*clear_filter))
+        .values(preco_atual=None, preco_data=None, preco_loja_id=None, updated_at=CanonicalProduct.updated_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    return int(updated) + int(cleared)
@@ -0,0 +1,71 @@
+"""Cache em memória dos dados de produto/loja usados só para validar e rotular leituras.
+
+compare_prices, price_history e get_product_prices buscavam o Product/Store
+inteiro a cada chamada só para devolver 404 e ler descricao_norm/nome.
+O cache é por processo com TTL curto: quem altera o cadastro invalida o próprio
+worker e os demais enxergam a mudança em até `ttl` segundos. Por isso não serve
+para caminhos de escrita (um registro removido por outro worker ainda pode estar
+aqui e o INSERT violaria a FK): esses validam direto no banco.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+from sqlalchemy.orm import Session
+
+from ..models import Product, Store
+
+# produto_id -> {"descricao_norm", "unidade_base"}; ausências não são cacheadas
+_product_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+# loja_id -> {"nome"}
+_store_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+_lock = threading.Lock()
+
+
+def get_product_meta(db: Session, produto_id: int) -> Optional[dict]:
+    """descricao_norm/unidade_base do produto, ou None se não existir."""
+    with _lock:
+        cached = _product_cache.get(produto_id)
+    if cached is not None:
+        return cached
+
+    row = (
+        db.query(Product.descricao_norm, Product.unidade_base)
+        .filter(Product.id == produto_id)
+        .first()
+    )
+    if row is None:
+        return None
+    meta = {"descricao_norm": row.descricao_norm, "unidade_base": row.unidade_base}
+    with _lock:
+        _product_cache[produto_id] = meta
+    return meta
+
+
+def get_store_meta(db: Session, loja_id: int) -> Optional[dict]:
+    """Nome da loja, ou None se não existir."""
+    with _lock:
+        cached = _store_cache.get(loja_id)
+    if cached is not None:
+        return cached
+
+    row = db.query(Store.nome).filter(Store.id == loja_id).first()
+    if row is None:
+        return None
+    meta = {"nome": row.nome}
+    with _lock:
+        _store_cache[loja_id] = meta
+    return meta
+
+
+def forget_product(produto_id: int) -> None:
+    with _lock:
+        _product_cache.pop(produto_id, None)
+
+
+def forget_store(loja_id: int) -> None:
+    with _lock:
+        _store_cache.pop(loja_id, None)
@@ -1,9 +1,17 @@
 """Testes para endpoints da API."""
 
+import orjson
 import pytest
 from unittest.mock import patch, MagicMock
 
-from app.models import Receipt
+from fastapi import HTTPException, Request
+
+from app.etag import json_response_with_etag
+from app.models import Price, Product, Receipt, Store
+from app.pagination import decode_cursor, encode_cursor
+from app.routers.prices import create_prices_bulk
+from app.routers.products import get_product_by_gtin, list_products
+from app.schemas import PriceCreate
 
 
 class TestHealthEndpoint:
@@ -142,3 +150,170 @@ class TestReceiptsEndpoints:
         """Retorna 404 ao tentar remover cupom inexistente."""
         response = client.delete(f"/receipts/{sample_chave}")
         assert response.status_code == 404
+
+
+def _make_request(headers: dict[str, str] | None = None) -> Request:
+    """Request mínimo para chamar os endpoints direto (sem limiter/lifespan)."""
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+class TestCursorPagination:
+    """Testes para paginação por cursor."""
+
+    def test_cursor_round_trip(self):
+        """decode_cursor devolve os valores codificados."""
+        cursor = encode_cursor("arroz tipo 1", 42)
+        assert decode_cursor(cursor) == ["arroz tipo 1", 42]
+
+    @pytest.mark.parametrize("cursor", ["nao-e-cursor!", encode_cursor("so-um")])
+    def test_decode_invalid_cursor(self, cursor):
+        """Cursor malformado ou com tamanho errado vira 400."""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(cursor)
+        assert exc.value.status_code == 400
+
+    def _list_products(self, db_session, cursor=None):
+        return list_products.__wrapped__(
+            _make_request(), db_session, page=1, page_size=2, search=None,
+            categoria=None, marca=None, cursor=cursor, with_total=False,
+        )
+
+    def test_list_products_next_cursor(self, db_session):
+        """next_cursor da primeira página leva às linhas seguintes."""
+        for desc in ("ARROZ", "FEIJAO", "LEITE"):
+            db_session.add(Product(descricao_norm=desc, unidade_base="un"))
+        db_session.commit()
+
+        first = orjson.loads(self._list_products(db_session).body)
+        assert [p["descricao_norm"] for p in first["items"]] == ["ARROZ", "FEIJAO"]
+        assert first["has_more"] is True
+
+        second = orjson.loads(self._list_products(db_session, first["next_cursor"]).body)
+        assert [p["descricao_norm"] for p in second["items"]] == ["LEITE"]
+        assert second["has_more"] is False
+        assert second["next_cursor"] is None
+
+    def test_list_products_invalid_cursor(self, db_session):
+        """Cursor com tipos errados retorna 400."""
+        with pytest.raises(HTTPException) as exc:
+            self._list_products(db_session, encode_cursor(1, "x"))
+        assert exc.value.status_code == 400
+        assert exc.value.detail == "Cursor inválido"
+
+
+class TestJsonResponseWithEtag:
+    """Testes para json_response_with_etag."""
+
+    def test_returns_etag_and_body(self):
+        """Primeira requisição recebe corpo, ETag e os headers extras."""
+        response = json_response_with_etag(
+            _make_request(), {"items": [1, 2]}, headers={"Cache-Control": "no-cache"}
+        )
+        assert response.status_code == 200
+        assert orjson.loads(response.body) == {"items": [1, 2]}
+        assert response.headers["etag"].startswith('W/"')
+        assert response.headers["cache-control"] == "no-cache"
+
+    def test_matching_if_none_match_returns_304(self):
+        """If-None-Match igual ao ETag retorna 304 sem corpo e mantém Cache-Control."""
+        content = {"items": [1, 2]}
+        etag = json_response_with_etag(_make_request(), content).headers["etag"]
+
+        response = json_response_with_etag(
+            _make_request({"If-None-Match": etag}), content,
+            headers={"Cache-Control": "no-cache"},
+        )
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["cache-control"] == "no-cache"
+
+    def test_stale_if_none_match_returns_body(self):
+        """ETag antigo não gera 304."""
+        response = json_response_with_etag(
+            _make_request({"If-None-Match": 'W/"antigo"'}), {"items": []}
+        )
+        assert response.status_code == 200
+
+
+class TestProductByGtin:
+    """Testes para busca de produto por GTIN."""
+
+    @pytest.mark.parametrize("gtin", ["1234567", "123456789012345", "abc12345", "7891000-abc"])
+    def test_rejects_invalid_gtin(self, gtin):
+        """Fora de 8 a 14 dígitos retorna 404 sem consultar o banco."""
+        db = MagicMock()
+        with pytest.raises(HTTPException) as exc:
+            get_product_by_gtin.__wrapped__(_make_request(), gtin, db)
+        assert exc.value.status_code == 404
+        db.query.assert_not_called()
+
+    @pytest.mark.parametrize("gtin", ["7891000100103", "789 1000 100103", "789-1000-100103", " 7891000100103 "])
+    @patch("app.routers.products.cache_set_json")
+    @patch("app.routers.products.cache_get_json", return_value=None)
+    def test_accepts_gtin_with_separators(self, mock_get, mock_set, db_session, gtin):
+        """Espaços e hífens são ignorados na busca."""
+        db_session.add(Product(descricao_norm="CAFE 500G", unidade_base="un", gtin="7891000100103"))
+        db_session.commit()
+
+        product = get_product_by_gtin.__wrapped__(_make_request(), gtin, db_session)
+        assert product.gtin == "7891000100103"
+        mock_get.assert_called_once()
+
+
+@patch("app.routers.prices.cache_delete")
+class TestPricesBulkEndpoint:
+    """Testes para registro de preços em lote."""
+
+    def _seed(self, db_session):
+        product = Product(descricao_norm="ARROZ 5KG", unidade_base="kg")
+        store = Store(cnpj="00000100000100", nome="Mercado Teste")
+        db_session.add_all([product, store])
+        db_session.commit()
+        return product, store
+
+    def test_bulk_creates_prices(self, mock_cache_delete, db_session):
+        """Grava todos os itens na ordem do payload."""
+        product, store = self._seed(db_session)
+        payload = [
+            PriceCreate(produto_id=product.id, loja_id=store.id, preco_por_unidade=5.5),
+            PriceCreate(produto_id=product.id, loja_id=store.id, preco_por_unidade=6.0),
+        ]
+
+        prices = create_prices_bulk.__wrapped__(_make_request(), db_session, payload)
+        assert [p.preco_por_unidade for p in prices] == [5.5, 6.0]
+        assert db_session.query(Price).count() == 2
+
+    def test_bulk_missing_product_writes_nothing(self, mock_cache_delete, db_session):
+        """Um produto inexistente retorna 404 e nada é gravado."""
+        product, store = self._seed(db_session)
+        payload = [
+            PriceCreate(produto_id=product.id, loja_id=store.id, preco_por_unidade=5.5),
+            PriceCreate(produto_id=9999, loja_id=store.id, preco_por_unidade=3.0),
+        ]
+
+        with pytest.raises(HTTPException) as exc:
+            create_prices_bulk.__wrapped__(_make_request(), db_session, payload)
+        assert exc.value.status_code == 404
+        assert "9999" in exc.value.detail
+        assert db_session.query(Price).count() == 0
+
+    def test_bulk_missing_store_writes_nothing(self, mock_cache_delete, db_session):
+        """Uma loja inexistente retorna 404 e nada é gravado."""
+        product, store = self._seed(db_session)
+        payload = [
+            PriceCreate(produto_id=product.id, loja_id=store.id, preco_por_unidade=5.5),
+            PriceCreate(produto_id=product.id, loja_id=7777, preco_por_unidade=3.0),
+        ]
+
+        with pytest.raises(HTTPException) as exc:
+            create_prices_bulk.__wrapped__(_make_request(), db_session, payload)
+        assert exc.value.status_code == 404
+        assert "7777" in exc.value.detail
+        assert db_session.query(Price).count() == 0
@@ -103,7 +103,7 @@ export const storesApi = {
 };
 
 export const productsApi = {
-  list: (params?: { page?: number; search?: string; categoria?: string }) =>
+  list: (params?: { page?: number; search?: string; categoria?: string; with_total?: boolean }) =>
     api.get<PaginatedResponse<Product>>('/products/', { params }),
   get: (id: number) => api.get<Product>(`/products/${id}`),
   create: (data: Partial<Product>) => api.post<Product>('/products/', data),
@@ -10,7 +10,7 @@ export function Prices() {
 
   const { data: products } = useQuery({
     queryKey: ['products', 'search', productSearch],
-    queryFn: () => productsApi.list({ search: productSearch || undefined, page: 1 }),
+    queryFn: () => productsApi.list({ search: productSearch || undefined, page: 1, with_total: false }),
     enabled: productSearch.length > 2,
   });
 
@@ -30,10 +30,11 @@ type CanonicalProduct = {
 
 type CanonicalListResponse = {
   items: CanonicalProduct[];
-  total: number;
+  total: number | null;
   page: number;
   page_size: number;
-  pages: number;
+  pages: number | null;
+  has_more: boolean;
 };
 
 function formatCurrencyBRL(value: number): string {
@@ -375,7 +376,7 @@ export default function ListDetailScreen() {
     const t = setTimeout(async () => {
       setIsSearching(true);
       try {
-        const res = await apiGet<CanonicalListResponse>('/canonical', { search: q, page: 1, page_size: 8 });
+        const res = await apiGet<CanonicalListResponse>('/canonical', { search: q, page: 1, page_size: 8, with_total: 'false' });
         const ranked = (res.items ?? [])
           .map((it) => ({ it, score: suggestionScore(it, q) }))
           .filter((x) => x.score > 0)